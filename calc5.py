@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 
 from collections import namedtuple
+import operator
 import traceback
 
+from lexcore import TableLexer
+
 
 Token = namedtuple('Token', ('type', 'value'))
 
@@ -27,45 +30,17 @@ class Node:
         self.right = right
 
 
-class Scanner:
-    def __init__(self, text):
-        self.text = text
-        self.pos = 0
-        self.current_char = self.text[self.pos]
+class Scanner(TableLexer):
+    symbols = operations
+    end_of_file = Token(EOF, None)
+    number_regex = r'\d+(?:\.\d*)?|\.\d*'
 
-    def advance(self):
-        self.pos += 1
-        if self.pos < len(self.text):
-            self.current_char = self.text[self.pos]
-        else:
-            self.current_char = ''
-
-    def integer(self):
-        result = self.current_char
-        self.advance()
-        decimal_point_found = result == '.'
-        while self.current_char.isdigit() or (not decimal_point_found and self.current_char == '.'):
-            result += self.current_char
-            if self.current_char == '.':
-                decimal_point_found = True
-            self.advance()
-
-        return Token(NUMBER, float(result))
-
-    def get_next_token(self):
-        while self.current_char.isspace():
-            self.advance()
-
-        if self.current_char == '':
-            return Token(EOF, None)
-        if self.current_char.isdigit() or self.current_char == '.':
-            return self.integer()
-        elif self.current_char in operations:
-            result = operations[self.current_char]
-            self.advance()
-            return result
-        else:
-            raise Exception('Unsanctioned character: {}'.format(self.current_char))
+    @staticmethod
+    def literal(number):
+        return Token(NUMBER, float(number))
+
+    def unexpected(self, char, offset):
+        raise Exception('Unsanctioned character: {}'.format(char))
 
 
 class Parser:
@@ -138,11 +113,28 @@ class Interpreter:
             return node.value
 
 
+# RPN instructions are (opcode, operator, operand) triples
+PUSH, APPLY, APPLY_CONSTANT = 'PUSH', 'APPLY', 'APPLY_CONSTANT'
+
+
 class Postfixer:
     """
-    Converts math AST into postfix
+    Converts math AST into postfix, as a string or as RPN instructions:
+
+    (PUSH, None, number)                push number
+    (APPLY, function, None)             pop y, pop x, push function(x, y)
+    (APPLY_CONSTANT, function, number)  pop x, push function(x, number)
+
+    Neither recurses, so trees of any depth convert
     """
     operations = ('+', '*', '-', '/')
+    functions = {
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '/': operator.truediv,
+    }
+    symbols = {function: symbol for symbol, function in functions.items()}
 
     def __init__(self, ast):
         self.ast = ast
@@ -151,14 +143,79 @@ class Postfixer:
         return self.to_postfix(self.ast)
 
     def to_postfix(self, node):
-        if node.value in self.operations:
-            string = "{} {} {}".format(self.to_postfix(node.left), self.to_postfix(node.right), node.value)
-        elif node.value.is_integer():
-            string = str(int(node.value))
-        else:
-            string = str(node.value)
+        words = []
+        for opcode, function, number in self.instructions(node):
+            if opcode != PUSH:
+                words.append(self.symbols[function])
+            elif number.is_integer():
+                words.append(str(int(number)))
+            else:
+                words.append(str(number))
+        return ' '.join(words)
+
+    def instructions(self, node=None):
+        """RPN instructions of the tree under node, the whole AST by default"""
+        result, pending = [], [self.ast if node is None else node]
+        # Operators go on pending as their function, after both operands
+        while pending:
+            node = pending.pop()
+            if not isinstance(node, Node):
+                result.append((APPLY, node, None))
+            elif node.value in self.operations:
+                pending.extend((self.functions[node.value], node.right, node.left))
+            else:
+                result.append((PUSH, None, node.value))
+        return result
 
-        return string
+
+class Peephole:
+    """
+    Optimises RPN instructions in one pass. Runs of constants are folded
+    into one, unless that raises, e.g. dividing by zero, which is left to
+    happen at run time. A push followed by an operator is fused into one
+    APPLY_CONSTANT
+    """
+    def __init__(self, instructions, fold=True):
+        self.instructions = instructions
+        self.fold = fold
+
+    def optimize(self):
+        result = []
+        for instruction in self.instructions:
+            opcode, function, _ = instruction
+            if opcode == APPLY and result and result[-1][0] == PUSH:
+                if self.fold and len(result) > 1 and result[-2][0] == PUSH:
+                    try:
+                        value = function(result[-2][2], result[-1][2])
+                    except ArithmeticError:
+                        pass
+                    else:
+                        result[-2:] = [(PUSH, None, value)]
+                        continue
+                instruction = (APPLY_CONSTANT, function, result.pop()[2])
+            result.append(instruction)
+        return result
+
+
+class RPNEvaluator:
+    """
+    Runs RPN instructions on a value stack, without recursion
+    """
+    def __init__(self, instructions):
+        self.instructions = instructions
+
+    def evaluate(self):
+        stack = []
+        push, pop = stack.append, stack.pop
+        for opcode, function, number in self.instructions:
+            if opcode == APPLY_CONSTANT:
+                stack[-1] = function(stack[-1], number)
+            elif opcode == PUSH:
+                push(number)
+            else:
+                right = pop()
+                stack[-1] = function(stack[-1], right)
+        return stack[-1]
 
 
 class Lisper:
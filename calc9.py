@@ -6,6 +6,8 @@ import operator
 import string
 import traceback
 
+from lexcore import TableLexer
+
 Token = namedtuple('Token', ('type', 'value'))
 EOF = 'EOF'
 NUMBER, PLUS, MINUS, TIMES, DIVIDE, INTEGER_DIVIDE, LPAREN, RPAREN = (
@@ -18,7 +20,7 @@ BEGIN, END, DIV = 'begin', 'end', 'div'
 """
 Lexical Analysis
 """
-class Lexer:
+class Lexer(TableLexer):
     operations = {
         '+': Token(PLUS, '+'),
         '-': Token(MINUS, '-'),
@@ -38,88 +40,26 @@ class Lexer:
         DIV: Token(INTEGER_DIVIDE, DIV)
     }
 
+    symbols = {
+        **operations,
+        ':=': assignment_token,
+        ';': semicolon,
+        '.': dot,
+    }
+
     acceptable_var_starters = string.ascii_letters + '_'
     acceptable_var_chars = acceptable_var_starters + string.digits
 
-    def __init__(self, text):
-        self.text = text
-        self.reset()
-
-    def reset(self):
-        self.pos = 0
-        self.current_char = self.text[self.pos]
-
-    def advance(self):
-        self.pos += 1
-        try:
-            self.current_char = self.text[self.pos]
-        except IndexError:
-            self.current_char = ''
-
-    def peek(self):
-        try:
-            return self.text[self.pos + 1]
-        except IndexError:
-            return ''
-
-    def _id(self):
-        result = ''
-        if self.current_char in self.acceptable_var_starters:
-            while self.current_char and self.current_char in self.acceptable_var_chars:
-                result += self.current_char
-                self.advance()
-        return result
+    identifier_regex = f'[{acceptable_var_starters}][{acceptable_var_chars}]*'
+    number_regex = r'\d[\d.]*'
 
-    def identifier(self):
-        identifier = self._id().lower()
-        if identifier:
-            return self.reserved_words.get(identifier, Token(VARIABLE, identifier))
-
-    def assignment(self):
-        if self.current_char == ':':
-            self.advance()
-            if self.current_char == '=':
-                token = ':='
-                self.advance()
-                return token
-
-    def number(self):
-        result = ''
-        decimal_found = self.current_char == '.'
-        while self.current_char.isdigit() or (not decimal_found and self.current_char == '.'):
-            result += self.current_char
-            self.advance()
+    @staticmethod
+    def literal(number):
+        return Token(NUMBER, number)
 
-        return result
-
-    def get_next_token(self):
-        while self.current_char.isspace():
-            self.advance()
-        if self.current_char == '':
-            return self.end_of_file
-        elif self.current_char == ';':
-            self.advance()
-            return self.semicolon
-        elif self.current_char == '.':
-            self.advance()
-            return self.dot
-        elif (identifier := self.identifier()):
-            return identifier
-        elif (number := self.number()):
-            return Token(NUMBER, number)
-        elif (assignment := self.assignment()):
-            return self.assignment_token
-        elif self.current_char in self.operations:
-            token = self.operations[self.current_char]
-            self.advance()
-            return token
-        else:
-            raise ValueError(f'Unexpected character {self.current_char}')
-
-    def tokenize(self):
-        self.reset()
-        while (token := self.get_next_token()).type != EOF:
-            yield token
+    @staticmethod
+    def variable(name):
+        return Token(VARIABLE, name)
 
 
 """
@@ -145,7 +85,11 @@ class UnaryOp(AST):
 class Number(AST):
     def __init__(self, token):
         self.token = token
-        self.value = self.token.value
+        # Converted once here rather than on every evaluation
+        try:
+            self.value = int(self.token.value)
+        except ValueError:
+            self.value = float(self.token.value)
 
 
 class Assignment(BinaryOp):
@@ -153,7 +97,9 @@ class Assignment(BinaryOp):
 
 
 class Variable(Number):
-    pass
+    def __init__(self, token):
+        self.token = token
+        self.value = self.token.value
 
 
 class NoOp(AST):
@@ -169,8 +115,7 @@ class Compound(AST):
 Syntax Analysis
 program                 : compound_statement DOT
 compound_statement      : BEGIN statement_list END
-statement_list          : statement
-                        | statement SEMI statement_list
+statement_list          : statement (SEMI statement)*
 statement               : compound_statement
                         | assignment_statement
                         | empty
@@ -276,9 +221,9 @@ class Parser:
 
     def statement_list(self):
         result = [self.statement()]
-        if self.current_token.type == SEMICOLON:
+        while self.current_token.type == SEMICOLON:
             self.eat(SEMICOLON)
-            result.extend(self.statement_list())
+            result.append(self.statement())
         return result
 
     def statement(self):
@@ -335,10 +280,7 @@ class Interpreter:
         return self.unary_operations[node.token.type](self.visit(node.operand))
 
     def visit_number(self, node):
-        try:
-            return int(node.token.value)
-        except ValueError:
-            return float(node.token.value)
+        return node.value
 
     def visit_compound(self, node):
         for child in node.children:
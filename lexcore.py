@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+from array import array
+import re
+import sys
+
+
+"""
+Table-driven lexer core
+
+A dialect is a subclass that fills in the tables: symbols, reserved words,
+the identifier, number, space and comment regexes, and the hooks that turn
+literals and identifiers into tokens. The tables are compiled into a single
+master pattern per dialect, which skips any spaces and comments and then
+matches one token in a named group. The same pattern is compiled for bytes,
+so ASCII sources in bytes, memoryviews or mmaps are lexed without decoding.
+"""
+class TableLexer:
+    # Source text of each operator or punctuation -> its token
+    symbols = {}
+    # Case-folded reserved word -> its token
+    reserved_words = {}
+    # Patterns, None when the dialect has no such thing
+    identifier_regex = None
+    number_regex = r'\d+'
+    space_regex = r'\s+'
+    comment_regex = None
+
+    end_of_file = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.token_pattern = cls.compile()
+        cls.byte_pattern = re.compile(cls.token_pattern.pattern.encode('ascii'), re.DOTALL)
+        cls.byte_symbols = {symbol.encode('ascii'): token for symbol, token in cls.symbols.items()}
+
+    @classmethod
+    def compile(cls):
+        skip = '|'.join(pattern for pattern in (cls.space_regex, cls.comment_regex) if pattern)
+        # Longest symbols first so ':=' wins over ':', single chars as a class
+        symbols = [
+            re.escape(symbol)
+            for symbol in sorted(cls.symbols, key=len, reverse=True)
+            if len(symbol) > 1
+        ]
+        if (chars := ''.join(re.escape(symbol) for symbol in cls.symbols if len(symbol) == 1)):
+            symbols.append(f'[{chars}]')
+
+        tokens = []
+        if cls.identifier_regex:
+            tokens.append(f'(?P<identifier>{cls.identifier_regex})')
+        tokens.append(f'(?P<number>{cls.number_regex})')
+        if symbols:
+            tokens.append(f'(?P<symbol>{"|".join(symbols)})')
+        # Anything else is an error, and the bare $ only matches at the end
+        tokens.extend(['(?P<error>.)', '$'])
+        return re.compile(f'(?:{skip})*(?:{"|".join(tokens)})', re.DOTALL)
+
+    def __init__(self, text, identifiers=None):
+        """
+        identifiers maps identifier spellings to their tokens; pass the same
+        dict to several lexers to share it across a batch of programs
+        """
+        self.text = text
+        self.identifiers = {} if identifiers is None else identifiers
+        if isinstance(text, str):
+            self.pattern, self.matched_token = self.token_pattern, self.match_token
+        else:
+            self.pattern, self.matched_token = self.byte_pattern, self.match_byte_token
+        self.reset()
+
+    def reset(self):
+        self.pos = 0
+        self.token_start = 0
+        # Start offset of each token tokenize() has yielded
+        self.offsets = array('I')
+
+    def literal(self, number):
+        """Token for the text of a numeric literal"""
+        raise NotImplementedError
+
+    def variable(self, name):
+        """Token for a case-folded identifier that is not a reserved word"""
+        raise NotImplementedError
+
+    def unexpected(self, char, offset):
+        """Raise for an unexpected character, or return a token to end on"""
+        raise ValueError(f'Unexpected character {char}')
+
+    def invalid_literal(self, number, offset):
+        """Raise for a numeric literal that literal() cannot convert"""
+        raise ValueError(f'Invalid literal of {len(number)} characters')
+
+    def identifier_token(self, spelling):
+        """
+        One shared token per identifier: the case-folded, interned name is
+        worked out once per spelling and cached in self.identifiers
+        """
+        try:
+            return self.identifiers[spelling]
+        except KeyError:
+            identifier = sys.intern(spelling.lower())
+            token = (
+                self.identifiers.get(identifier)
+                or self.reserved_words.get(identifier)
+                or self.variable(identifier)
+            )
+            self.identifiers[spelling] = self.identifiers[identifier] = token
+            return token
+
+    def match_token(self, match):
+        """Token for a token_pattern match, end_of_file at the end of the text"""
+        kind = match.lastgroup
+        if kind == 'identifier':
+            return self.identifier_token(match.group(kind))
+        elif kind == 'symbol':
+            return self.symbols[match.group(kind)]
+        elif kind == 'number':
+            try:
+                return self.literal(match.group(kind))
+            except ValueError:
+                return self.invalid_literal(match.group(kind), match.start(kind))
+        elif kind == 'error':
+            return self.unexpected(match.group(kind), match.start(kind))
+        return self.end_of_file
+
+    def match_byte_token(self, match):
+        """match_token for a byte_pattern match, only identifiers and literals become str"""
+        kind = match.lastgroup
+        if kind == 'identifier':
+            return self.identifier_token(str(match.group(kind), 'ascii'))
+        elif kind == 'symbol':
+            return self.byte_symbols[match.group(kind)]
+        elif kind == 'number':
+            try:
+                return self.literal(str(match.group(kind), 'ascii'))
+            except ValueError:
+                return self.invalid_literal(str(match.group(kind), 'ascii'), match.start(kind))
+        elif kind == 'error':
+            return self.unexpected(chr(match.group(kind)[0]), match.start(kind))
+        return self.end_of_file
+
+    def get_next_token(self):
+        match = self.pattern.match(self.text, self.pos)
+        token = self.matched_token(match)
+        # Stay put at the end, so every later call returns end_of_file too
+        if token is not self.end_of_file:
+            self.pos = match.end()
+        self.token_start = match.start(match.lastindex) if match.lastindex else match.end()
+        return token
+
+    def tokenize(self):
+        self.reset()
+        match_token, offsets, end_of_file = self.matched_token, self.offsets, self.end_of_file
+        for match in self.pattern.finditer(self.text):
+            if (token := match_token(match)) is end_of_file:
+                return
+            offsets.append(match.start(match.lastindex))
+            yield token
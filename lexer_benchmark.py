@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+import os
+import sys
+import timeit
+
+root = os.path.dirname(os.path.abspath(__file__))
+sys.path.extend([os.path.join(root, 'part9'), os.path.join(root, 'part10')])
+
+from calc4.tokenizer import tokenize as calc4_tokenize
+from calc5 import Scanner, EOF
+from calc9 import Lexer as Calc9Lexer
+from lexer import Lexer as Part10Lexer
+from tokenizer import Tokenizer as Part9Tokenizer
+
+
+"""
+Throughput of every dialect built on the shared lexer core
+"""
+def expression(terms):
+    return ' + '.join(f'{i} * {i % 7 + 1} - {i % 13}' for i in range(terms))
+
+
+def program(statements):
+    body = ';\n'.join(f'    value_{i % 100} := ({i} + number * 3) DIV 7 - 25 / x' for i in range(statements))
+    return f'BEGIN\n{body}\nEND.'
+
+
+def scan_all(scanner):
+    while scanner.get_next_token().type != EOF:
+        pass
+
+
+def main(size):
+    arithmetic, pascal = expression(size), program(size // 2)
+    dialects = (
+        ('calc4.tokenize', lambda: list(calc4_tokenize(arithmetic))),
+        ('part9 Tokenizer', lambda: list(Part9Tokenizer(arithmetic).tokenize())),
+        ('calc5 Scanner', lambda: scan_all(Scanner(arithmetic))),
+        ('calc9 Lexer', lambda: list(Calc9Lexer(pascal).tokenize())),
+        ('part10 Lexer', lambda: list(Part10Lexer(pascal, engine='regex').tokenize())),
+    )
+    for name, run in dialects:
+        seconds = min(timeit.repeat(run, number=1, repeat=3))
+        print(f'{name:<20} {seconds:8.4f}s')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
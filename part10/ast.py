@@ -1,45 +1,95 @@
 #!/usr/bin/env python
 
+from constants import OPERATOR_CODES
+
 """
 Abstract Syntax Tree
+
+Nodes have __slots__ and keep no tokens: operators are stored as their
+small int code from OPERATOR_CODES, names and literals as their value
 """
 class AST:
-    @property
-    def name(self):
-        return type(self).__name__.lower()
+    __slots__ = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.name = cls.__name__.lower()
 
 
 class BinaryOp(AST):
+    __slots__ = ('op', 'left', 'right')
+
     def __init__(self, token, left, right):
-        self.token = token
+        self.op = OPERATOR_CODES[token.type]
         self.left = left
         self.right = right
 
 
 class UnaryOp(AST):
+    __slots__ = ('op', 'operand')
+
     def __init__(self, token, operand):
-        self.token = token
+        self.op = OPERATOR_CODES[token.type]
         self.operand = operand
 
 
 class Number(AST):
+    __slots__ = ('value',)
+
     def __init__(self, token):
-        self.token = token
-        self.value = self.token.value
+        self.value = token.value
 
 
 class Assignment(BinaryOp):
-    pass
+    __slots__ = ()
 
 
 class Variable(Number):
-    pass
+    __slots__ = ()
 
 
 class NoOp(AST):
-    pass
+    __slots__ = ()
+
+    def __new__(cls):
+        # Empty statements are all alike, so they share one node
+        return cls.instance
+
+
+NoOp.instance = object.__new__(NoOp)
 
 
 class Compound(AST):
+    __slots__ = ('children',)
+
     def __init__(self, children=None):
         self.children = children or []
+
+
+class Program(AST):
+    """PROGRAM identifier with the SymbolTable of its declarations and its block"""
+    __slots__ = ('identifier', 'symbols', 'block')
+
+    def __init__(self, identifier, symbols, block):
+        self.identifier = identifier
+        self.symbols = symbols
+        self.block = block
+
+
+class LazyCompound(Compound):
+    """
+    Compound statement whose children are only built by parse() the first
+    time they are asked for
+    """
+    __slots__ = ('parse', 'parsed')
+
+    def __init__(self, parse):
+        self.parse = parse
+        self.parsed = None
+
+    @property
+    def children(self):
+        if self.parsed is None:
+            self.parsed = self.parse()
+            self.parse = None
+        return self.parsed
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+import os
+import pickle
+import sys
+import timeit
+import tracemalloc
+
+# The part10 modules import each other from this directory, and the shared
+# lexer core, lexcore.py, from the top of the repository
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bytecode import VM, Bytecode
+from codegen import CodeGenerator
+from compiler import Compiler
+from flat import FlatTree
+from incremental import IncrementalParser
+from interpreter import Interpreter
+from lexer import Lexer
+from parallel import parallel_tokenize
+from parser import Parser
+from tokenstream import TokenStream
+
+
+"""
+Benchmarks on large generated programs
+"""
+def generate_program(statements=10_000):
+    lines = [
+        'PROGRAM Bench;',
+        'VAR',
+        '    ' + ', '.join(f'value_{i}' for i in range(min(statements, 100))) + ' : REAL;',
+        '    number, done : INTEGER;',
+        '    x : REAL;',
+        'BEGIN',
+        '    number := 3; x := 2.0;',
+    ]
+    for i in range(statements):
+        lines.append(f'    value_{i % 100} := ({i} + number * 3) DIV 7 - 2.5 / x; {{ statement {i} }}')
+    lines.append('    done := 1')
+    lines.append('END.')
+    return '\n'.join(lines)
+
+
+def generate_expression(terms=10_000):
+    return ' + '.join(f'-({i} * x - 2.5) div {i % 9 + 1} / y' for i in range(terms))
+
+
+def report(name, seconds, count, unit='tokens'):
+    print(f'{name:<32} {seconds:8.4f}s  {count / seconds:14,.0f} {unit}/s')
+
+
+def bench_lexer_engines(text, repeat=3):
+    count = sum(1 for _ in Lexer(text).tokenize())
+    for engine in Lexer.engines:
+        seconds = min(timeit.repeat(lambda: list(Lexer(text, engine=engine).tokenize()), number=1, repeat=repeat))
+        report(f'lexer engine={engine}', seconds, count)
+    source = text.encode()
+    seconds = min(timeit.repeat(lambda: list(Lexer(source).tokenize()), number=1, repeat=repeat))
+    report('lexer engine=bytes', seconds, count)
+
+
+def bench_parallel_lexer(text, workers=(1, 2, 4, 8)):
+    count = sum(1 for _ in Lexer(text, engine='regex').tokenize())
+    for worker_count in workers:
+        seconds = min(timeit.repeat(lambda: list(parallel_tokenize(text, worker_count)), number=1, repeat=3))
+        report(f'parallel lexer workers={worker_count}', seconds, count)
+
+
+def bench_expression_parsers(text, repeat=3):
+    tokens = list(Lexer(text, engine='regex').tokenize())
+    for engine in Parser.engines:
+        seconds = min(timeit.repeat(lambda: Parser(tokens, engine=engine).parse(), number=1, repeat=repeat))
+        report(f'expression parser engine={engine}', seconds, len(tokens))
+
+
+def bench_fused_parser(text, repeat=3):
+    count = len(TokenStream(text))
+    for engine in Lexer.engines:
+        for name, lookahead in (
+            ('Lexer', None),
+            ('TokenBuffer', 4),
+        ):
+            seconds = min(timeit.repeat(lambda: Parser(Lexer(text, engine=engine), lookahead=lookahead).parse_program(), number=1, repeat=repeat))
+            report(f'parse {engine} via {name}', seconds, count)
+
+
+def allocated(build):
+    """Bytes still allocated by the result of build()"""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def bench_token_memory(text):
+    count = len(TokenStream(text))
+    for name, build in (
+        ('list of Tokens', lambda: list(Lexer(text, engine='regex').tokenize())),
+        ('TokenStream', lambda: TokenStream(text)),
+    ):
+        size = allocated(build)
+        print(f'{name:<32} {size:12,} bytes  {size / count:6.1f} bytes/token')
+
+
+def count_nodes(tree):
+    count, stack = 0, [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(getattr(node, 'children', ()))
+        stack.extend(child for child in (getattr(node, 'left', None), getattr(node, 'right', None), getattr(node, 'operand', None), getattr(node, 'block', None)) if child)
+    return count
+
+
+def bench_ast_memory(text):
+    tokens = list(Lexer(text, engine='regex').tokenize())
+    tree = Parser(tokens).parse_program()
+    count = count_nodes(tree)
+    size = allocated(lambda: Parser(tokens).parse_program())
+    print(f'{"AST":<32} {size:12,} bytes  {size / count:6.1f} bytes/node  {count:,} nodes')
+
+
+def generate_blocks(statements, block=100):
+    body = ';\n'.join(
+        '    BEGIN ' + '; '.join(f'value_{i % 100} := ({i} + number * 3) DIV 7 - 2.5 / x' for i in range(start, start + block)) + ' END'
+        for start in range(0, statements, block)
+    )
+    return f'BEGIN\n    first := 1;\n{body}\nEND.'
+
+
+def bench_lazy_parse(statements):
+    stream = TokenStream(generate_blocks(statements))
+    for lazy in (False, True):
+        seconds = min(timeit.repeat(lambda: Parser(stream, lazy=lazy).parse_program(), number=1, repeat=3))
+        report(f'parse lazy={lazy}', seconds, len(stream))
+
+
+def bench_incremental_parse(statements, edits=100):
+    text = generate_blocks(statements)
+    parser = IncrementalParser(text)
+    offset = text.index(':=', len(text) // 2) + 4
+    seconds = min(timeit.repeat(lambda: Parser(TokenStream(text)).parse_program(), number=1, repeat=3))
+    report('full reparse per edit', seconds, 1, 'edits')
+    seconds = timeit.timeit(lambda: parser.edit(offset, 0, '1'), number=edits) / edits
+    report('IncrementalParser.edit per edit', seconds, 1, 'edits')
+
+
+def bench_flat_format(text, repeat=3):
+    tree = Parser(Lexer(text, engine='regex').tokenize()).parse_program()
+    for name, dump, load in (
+        ('pickle', lambda: pickle.dumps(tree, pickle.HIGHEST_PROTOCOL), pickle.loads),
+        ('flat', lambda: FlatTree.from_ast(tree).to_bytes(), FlatTree.from_buffer),
+    ):
+        data = dump()
+        dump_time = min(timeit.repeat(dump, number=1, repeat=repeat))
+        load_time = min(timeit.repeat(lambda: load(data), number=1, repeat=repeat))
+        print(f'{name + " format":<32} {len(data):12,} bytes  dump {dump_time:.4f}s  load {load_time:.4f}s')
+
+
+def bench_closure_compiler(text, runs=10):
+    tree = Parser(Lexer(text, engine='regex')).parse_program()
+    count = count_nodes(tree)
+    seconds = timeit.timeit(lambda: Interpreter(tree).interpret(), number=runs) / runs
+    report('Interpreter per run', seconds, count, 'nodes')
+    seconds = timeit.timeit(lambda: Compiler(tree).compile(), number=1)
+    report('Compiler.compile', seconds, count, 'nodes')
+    run = Compiler(tree).compile()
+    seconds = timeit.timeit(run, number=runs) / runs
+    report('compiled closures per run', seconds, count, 'nodes')
+
+
+def bench_code_generator(text, runs=10):
+    tree = Parser(Lexer(text, engine='regex')).parse_program()
+    count = count_nodes(tree)
+    seconds = timeit.timeit(lambda: CodeGenerator(tree).compile(), number=1)
+    report('CodeGenerator.compile', seconds, count, 'nodes')
+    seconds = timeit.timeit(lambda: CodeGenerator(tree).compile(), number=runs) / runs
+    report('CodeGenerator.compile cached', seconds, count, 'nodes')
+    run = CodeGenerator(tree).compile()
+    seconds = timeit.timeit(run, number=runs) / runs
+    report('generated code per run', seconds, count, 'nodes')
+
+
+def bench_bytecode_vm(text, runs=10):
+    tree = Parser(Lexer(text, engine='regex')).parse_program()
+    bytecode = Bytecode.from_ast(tree)
+    seconds = timeit.timeit(lambda: Interpreter(tree).interpret(), number=runs) / runs
+    report('Interpreter per run', seconds, len(bytecode), 'instructions')
+    seconds = timeit.timeit(lambda: Bytecode.from_ast(tree), number=1)
+    report('Bytecode.from_ast', seconds, len(bytecode), 'instructions')
+    vm = VM(Bytecode.from_buffer(bytecode.to_bytes()))
+    seconds = timeit.timeit(vm.run, number=runs) / runs
+    report('VM per run', seconds, len(bytecode), 'instructions')
+
+
+def bench_incremental_edit(text, edits=100):
+    stream = TokenStream(text)
+    offset = text.index(':=', len(text) // 2) + 3
+    seconds = min(timeit.repeat(lambda: TokenStream(text), number=1, repeat=3))
+    report('full re-lex per edit', seconds, 1, 'edits')
+    seconds = timeit.timeit(lambda: stream.edit(offset, 0, '1'), number=edits) / edits
+    report('TokenStream.edit per edit', seconds, 1, 'edits')
+
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    text = generate_program(statements)
+    print(f'{statements} statements, {len(text):,} chars')
+    bench_lexer_engines(text)
+    bench_expression_parsers(generate_expression(statements))
+    bench_fused_parser(text)
+    bench_token_memory(text)
+    bench_ast_memory(text)
+    bench_flat_format(text)
+    bench_closure_compiler(text)
+    bench_code_generator(text)
+    bench_bytecode_vm(text)
+    bench_lazy_parse(statements)
+    bench_incremental_parse(statements)
+    bench_parallel_lexer(text)
+    bench_incremental_edit(text)
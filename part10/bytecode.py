@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+
+from array import array
+import os
+import struct
+import sys
+
+if __name__ == '__main__':
+    # Run as a script, the shared lexer core, lexcore.py, is found at the top
+    # of the repository
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ast import BinaryOp, NoOp, Number, Assignment, Variable, Compound, Program
+from constants import PLUS, MINUS, TIMES, DIVIDE, INTEGER_DIVIDE, OPERATOR_CODES, INTEGER, REAL
+from interpreter import Interpreter
+from lexer import Lexer
+from parser import Parser
+
+# Opcodes
+(
+    ADD, SUBTRACT, MULTIPLY, DIVIDE_REAL, DIVIDE_INTEGER, NEGATE,
+    PUSH_INTEGER, PUSH_REAL, LOAD, STORE, STORE_INTEGER, STORE_REAL, RETURN,
+    PUSH_BIG_INTEGER,
+) = range(14)
+
+# Variable types by slot, 0 for undeclared variables
+TYPES = (None, INTEGER, REAL)
+
+
+"""
+Bytecode
+
+A program compiled to instructions for a stack machine. Each instruction is
+an opcode and an operand in the code array:
+
+PUSH_INTEGER, PUSH_REAL     push the constant at operand in its pool
+PUSH_BIG_INTEGER            push the integer at operand in the big integers
+LOAD, STORE                 push, or pop into, the variable in slot operand
+STORE_INTEGER, STORE_REAL   STORE with the store rules of a declared type
+ADD ... DIVIDE_INTEGER      pop two values, push the result
+NEGATE                      negate the top of the stack
+RETURN                      stop with the value on top of the stack
+
+Without RETURN a program stops at the end of the code with the table of its
+variables. Variable slots index the name pool, and types gives the declared
+type of each as its index in TYPES. Integer literals that do not fit the
+int64 pool are kept as decimal strings in a pool of big integers.
+
+The binary format is a header of the length of each array followed by the
+arrays, 8-byte aligned, in little-endian order, like a flat AST.
+"""
+class Bytecode:
+    magic = b'PASCODE\0'
+    version = 2
+    # Names are UTF-8 in one blob, name i spans name_offsets[i:i + 2], and
+    # likewise the digits of big integers
+    sections = (
+        ('integers', 'q'), ('reals', 'd'), ('code', 'i'), ('name_offsets', 'I'),
+        ('types', 'B'), ('name_bytes', 'B'), ('big_offsets', 'I'), ('big_digits', 'B'),
+    )
+    # magic, version and the length of each section
+    header = struct.Struct(f'<8sI{len(sections)}I')
+
+    binary_opcodes = {
+        OPERATOR_CODES[PLUS]: ADD,
+        OPERATOR_CODES[MINUS]: SUBTRACT,
+        OPERATOR_CODES[TIMES]: MULTIPLY,
+        OPERATOR_CODES[DIVIDE]: DIVIDE_REAL,
+        OPERATOR_CODES[INTEGER_DIVIDE]: DIVIDE_INTEGER,
+    }
+
+    def __init__(self):
+        self.code = array('i')
+        self.integers, self.reals = array('q'), array('d')
+        self.name_offsets, self.name_bytes, self.types = array('I', [0]), array('B'), array('B')
+        self.big_offsets, self.big_digits = array('I', [0]), array('B')
+        self.pool = {}
+
+    def __len__(self):
+        """Number of instructions"""
+        return len(self.code) // 2
+
+    def __reduce__(self):
+        # Views into a buffer do not pickle, the bytes do
+        return self.from_buffer, (self.to_bytes(),)
+
+    def name(self, slot):
+        offsets = self.name_offsets
+        return str(memoryview(self.name_bytes)[offsets[slot]:offsets[slot + 1]], 'utf-8')
+
+    def names(self):
+        return [self.name(slot) for slot in range(len(self.types))]
+
+    def big_integers(self):
+        offsets, digits = self.big_offsets, memoryview(self.big_digits)
+        return [int(str(digits[start:end], 'ascii')) for start, end in zip(offsets, offsets[1:])]
+
+    def constant(self, pool, value):
+        """Index of value in the pool array, added the first time"""
+        # repr tells 0.0 from -0.0 and 1 from 1.0
+        key = (pool.typecode, repr(value))
+        if (index := self.pool.get(key)) is None:
+            index = self.pool[key] = len(pool)
+            pool.append(value)
+        return index
+
+    def big_integer(self, value):
+        """Index of integer value in the big integers, added the first time"""
+        key = ('integer', value)
+        if (index := self.pool.get(key)) is None:
+            index = self.pool[key] = len(self.big_offsets) - 1
+            self.big_digits.frombytes(str(value).encode('ascii'))
+            self.big_offsets.append(len(self.big_digits))
+        return index
+
+    def slot(self, name):
+        key = ('name', name)
+        if (index := self.pool.get(key)) is None:
+            index = self.pool[key] = len(self.types)
+            self.name_bytes.frombytes(name.encode('utf-8'))
+            self.name_offsets.append(len(self.name_bytes))
+            self.types.append(0)
+        return index
+
+    def emit(self, opcode, operand=0):
+        self.code.append(opcode)
+        self.code.append(operand)
+
+    @classmethod
+    def from_ast(cls, tree):
+        bytecode = cls()
+        node = tree
+        if isinstance(node, Program):
+            for name, type in node.symbols.items():
+                bytecode.types[bytecode.slot(name)] = TYPES.index(type)
+            node = node.block
+
+        # Instructions come out in post-order, without recursing
+        pending = [(node, False)]
+        while pending:
+            node, children_done = pending.pop()
+            if isinstance(node, Compound):
+                pending.extend((child, False) for child in reversed(node.children))
+            elif isinstance(node, NoOp):
+                # Empty statements compile to nothing
+                continue
+            elif isinstance(node, Variable):
+                bytecode.emit(LOAD, bytecode.slot(node.value))
+            elif isinstance(node, Number):
+                if isinstance(node.value, float):
+                    bytecode.emit(PUSH_REAL, bytecode.constant(bytecode.reals, node.value))
+                elif -1 << 63 <= node.value < 1 << 63:
+                    bytecode.emit(PUSH_INTEGER, bytecode.constant(bytecode.integers, node.value))
+                else:
+                    bytecode.emit(PUSH_BIG_INTEGER, bytecode.big_integer(node.value))
+            elif not children_done:
+                pending.append((node, True))
+                if isinstance(node, Assignment):
+                    pending.append((node.right, False))
+                elif isinstance(node, BinaryOp):
+                    pending.extend(((node.right, False), (node.left, False)))
+                else:
+                    pending.append((node.operand, False))
+            elif isinstance(node, Assignment):
+                slot = bytecode.slot(node.left.value)
+                bytecode.emit((STORE, STORE_INTEGER, STORE_REAL)[bytecode.types[slot]], slot)
+            elif isinstance(node, BinaryOp):
+                bytecode.emit(cls.binary_opcodes[node.op])
+            elif node.op == OPERATOR_CODES[MINUS]:
+                bytecode.emit(NEGATE)
+
+        if not isinstance(tree, (Compound, Program)):
+            bytecode.emit(RETURN)
+        return bytecode
+
+    def to_bytes(self):
+        sections = [getattr(self, name) for name, _ in self.sections]
+        parts = [self.header.pack(self.magic, self.version, *map(len, sections))]
+        size = self.header.size
+        for data in sections:
+            if sys.byteorder == 'big':
+                data = array(data.typecode, data)
+                data.byteswap()
+            padding = -size % 8
+            parts.extend((bytes(padding), data.tobytes()))
+            size += padding + len(data) * data.itemsize
+        return b''.join(parts)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Bytecode over buffer, whose arrays are views into it"""
+        view = memoryview(buffer).cast('B')
+        if len(view) < cls.header.size:
+            raise ValueError('Not bytecode: too short')
+        magic, version, *lengths = cls.header.unpack_from(view)
+        if magic != cls.magic:
+            raise ValueError('Not bytecode: bad magic number')
+        if version != cls.version:
+            raise ValueError(f'Unsupported bytecode version {version}')
+        bytecode = cls.__new__(cls)
+        offset = cls.header.size
+        for (name, typecode), length in zip(cls.sections, lengths):
+            offset += -offset % 8
+            end = offset + length * array(typecode).itemsize
+            if end > len(view):
+                raise ValueError('Not bytecode: truncated')
+            data = view[offset:end].cast(typecode)
+            if sys.byteorder == 'big':
+                data = array(typecode, data)
+                data.byteswap()
+            setattr(bytecode, name, data)
+            offset = end
+        if len(bytecode.name_offsets) != len(bytecode.types) + 1 or not bytecode.big_offsets or len(bytecode.code) % 2:
+            raise ValueError('Not bytecode: inconsistent lengths')
+        return bytecode
+
+
+class Unset:
+    """Value of a variable slot before the variable is assigned"""
+
+
+"""
+Virtual machine
+
+Runs Bytecode in one dispatch loop over the instructions, with a value
+stack and a list of variable slots. The arrays are unpacked into lists
+once, so each run only indexes lists, and big integers are appended to the
+integers with PUSH_BIG_INTEGER turned into PUSH_INTEGER.
+"""
+class VM:
+    def __init__(self, bytecode):
+        self.bytecode = bytecode
+        self.code = bytecode.code.tolist()
+        self.integers, self.reals = bytecode.integers.tolist(), bytecode.reals.tolist()
+        if big_integers := bytecode.big_integers():
+            code, base = self.code, len(self.integers)
+            for index in range(0, len(code), 2):
+                if code[index] == PUSH_BIG_INTEGER:
+                    code[index], code[index + 1] = PUSH_INTEGER, base + code[index + 1]
+            self.integers.extend(big_integers)
+        self.names = bytecode.names()
+        zeros = (Unset, 0, 0.0)
+        self.slots = [zeros[type] for type in bytecode.types]
+
+    def run(self):
+        """Same as Interpreter.interpret on the tree the bytecode came from"""
+        code, integers, reals, names = self.code, self.integers, self.reals, self.names
+        store_integer = Interpreter.store_integer
+        slots = self.slots.copy()
+        stack = []
+        push, pop = stack.append, stack.pop
+        instructions = iter(code)
+        for opcode, operand in zip(instructions, instructions):
+            if opcode == LOAD:
+                if (value := slots[operand]) is Unset:
+                    raise NameError(f'{names[operand]} is not defined')
+                push(value)
+            elif opcode == PUSH_INTEGER:
+                push(integers[operand])
+            elif opcode == PUSH_REAL:
+                push(reals[operand])
+            elif opcode == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif opcode == SUBTRACT:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif opcode == MULTIPLY:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif opcode == DIVIDE_REAL:
+                right = pop()
+                stack[-1] = stack[-1] / right
+            elif opcode == DIVIDE_INTEGER:
+                right = pop()
+                stack[-1] = stack[-1] // right
+            elif opcode == NEGATE:
+                stack[-1] = -stack[-1]
+            elif opcode == STORE:
+                slots[operand] = pop()
+            elif opcode == STORE_INTEGER:
+                slots[operand] = store_integer(names[operand], pop())
+            elif opcode == STORE_REAL:
+                slots[operand] = float(pop())
+            elif opcode == RETURN:
+                return pop()
+            else:
+                raise ValueError(f'Bad opcode {opcode}')
+        return {name: value for name, value in zip(names, slots) if value is not Unset}
+
+
+if __name__ == '__main__':
+    print(VM(Bytecode.from_ast(Parser(Lexer(sys.stdin.read())).parse_program())).run())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+from collections import OrderedDict
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+
+from flat import FlatTree
+from lexer import Lexer
+from parser import Parser
+
+
+"""
+Parse cache
+
+Trees of programs parsed before are kept in an in-process LRU, backed by a
+directory of flat trees (see flat.py) like __pycache__. Files are named by
+the hash of the source and of the interpreter and format versions, so a
+stale file is never read, and written atomically, so a reader never sees a
+partial one. The least recently used files are removed when the directory
+grows past its size limit.
+
+Cached trees are shared between callers and must not be modified.
+"""
+class ParseCache:
+    suffix = '.flat'
+    tag = f'{sys.implementation.cache_tag}-flat{FlatTree.version}'
+
+    def __init__(self, directory=None, size=128, disk_size=64 << 20):
+        """
+        size is the number of trees kept in memory, disk_size the number of
+        bytes kept in directory. Without a directory only memory is used
+        """
+        self.directory = directory
+        self.size = size
+        self.disk_size = disk_size
+        self.trees = OrderedDict()
+        self.hits = self.disk_hits = self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses}
+
+    def key(self, text):
+        return hashlib.sha256(f'{self.tag}\0{text}'.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def parse_program(self, text):
+        key = self.key(text)
+        if (tree := self.trees.get(key)) is not None:
+            self.trees.move_to_end(key)
+            self.hits += 1
+            return tree
+
+        if (tree := self.load(key)) is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            tree = Parser(Lexer(text, engine='regex').tokenize()).parse_program()
+            self.store(key, tree)
+
+        self.trees[key] = tree
+        if len(self.trees) > self.size:
+            self.trees.popitem(last=False)
+        return tree
+
+    def load(self, key):
+        """Tree cached on disk under key, None if there is none or it is unreadable"""
+        if self.directory is None:
+            return None
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                tree = FlatTree.from_buffer(file.read()).to_ast()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, IndexError):
+            self.remove(path)
+            return None
+        # Mark it recently used for eviction, as far as the directory allows
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return tree
+
+    def store(self, key, tree):
+        """Write tree to disk under key, skipped if it cannot be encoded"""
+        if self.directory is None:
+            return
+        try:
+            data = FlatTree.from_ast(tree).to_bytes()
+        except (OverflowError, ValueError, struct.error):
+            # The tree is still good, it is only left uncached on disk
+            return
+        # Disk errors leave the tree uncached as well
+        try:
+            file = tempfile.NamedTemporaryFile(dir=self.directory, prefix='.', suffix='.tmp', delete=False)
+        except OSError:
+            return
+        try:
+            with file:
+                file.write(data)
+            os.replace(file.name, self.path(key))
+        except OSError:
+            self.remove(file.name)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used files until the directory fits disk_size"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.endswith(self.suffix):
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_size:
+                break
+            self.remove(path)
+            total -= size
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
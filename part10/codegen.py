@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+from collections import OrderedDict
+import math
+import os
+import sys
+
+if __name__ == '__main__':
+    # Run as a script, the shared lexer core, lexcore.py, is found at the top
+    # of the repository
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ast import BinaryOp, Number, Assignment, Variable, Compound, Program
+from constants import PLUS, MINUS, TIMES, DIVIDE, INTEGER_DIVIDE, OPERATOR_CODES, INTEGER
+from interpreter import Interpreter
+from lexer import Lexer
+from parser import Parser
+
+
+"""
+Python code generation
+
+Translates the AST into the source of a Python function, one straight-line
+assignment to a local variable per assignment statement, and compiles it.
+The function returns the same as Interpreter.interpret, so running the
+program again costs a single call with no per-node overhead at all.
+
+Variables become locals numbered in the order they are first set, v0, v1
+and so on, and their names only appear in the source as string literals.
+So no name clashes with Python keywords, builtins or the t<n> temporaries
+that very deep expressions are split into to stay within the Python
+compiler's nesting limits, and a tree loaded from a FlatTree or a
+ParseCache cannot smuggle code in through a name, which must be a valid
+identifier or generating the source raises ValueError. With no control
+flow, which variables are set is known at every statement: reading one
+before it is set compiles to a call raising NameError there.
+
+The code object is cached per program, so another CodeGenerator for the
+same program neither generates nor compiles it again. A program is its
+tree unless a key is given, so a tree must not change once compiled.
+
+Lazily parsed blocks are all parsed while the source is generated.
+"""
+def undefined(name):
+    raise NameError(f'{name} is not defined')
+
+
+class CodeGenerator:
+    binary_operators = {
+        OPERATOR_CODES[PLUS]: '+',
+        OPERATOR_CODES[MINUS]: '-',
+        OPERATOR_CODES[TIMES]: '*',
+        OPERATOR_CODES[DIVIDE]: '/',
+        OPERATOR_CODES[INTEGER_DIVIDE]: '//',
+    }
+    unary_operators = {OPERATOR_CODES[PLUS]: '', OPERATOR_CODES[MINUS]: '-'}
+    # Nesting depth past which a subexpression goes to a temporary
+    spill_depth = 50
+    helpers = {'undefined': undefined, 'store_integer': Interpreter.store_integer}
+    # Code objects of the most recently compiled programs, by key
+    codes = OrderedDict()
+    codes_size = 128
+
+    def __init__(self, ast, key=None):
+        """
+        key identifies the program, e.g. the ParseCache.key of its source.
+        By default it is the tree itself
+        """
+        self.ast = ast
+        self.key = ast if key is None else key
+        self._source = None
+
+    @property
+    def source(self):
+        """Python source of the generated function, for debugging"""
+        if self._source is None:
+            self._source = self.generate()
+        return self._source
+
+    def compile(self):
+        """Function running the program, returning the same as Interpreter.interpret"""
+        namespace = dict(self.helpers)
+        exec(self.code(), namespace)
+        return namespace['program']
+
+    def code(self):
+        """Code object of the program, generated and compiled once per key"""
+        codes, key = self.codes, self.key
+        if (code := codes.get(key)) is not None:
+            codes.move_to_end(key)
+            return code
+        code = codes[key] = compile(self.source, '<part10>', 'exec')
+        if len(codes) > self.codes_size:
+            codes.popitem(last=False)
+        return code
+
+    @staticmethod
+    def checked(name):
+        """name, if it is a valid variable name"""
+        if not isinstance(name, str) or not Lexer.identifier_pattern.fullmatch(name):
+            raise ValueError(f'Bad variable name {name!r}')
+        return name
+
+    def variable(self, name, type, names):
+        """Local and type of variable name, the next local the first time it is set"""
+        if (variable := names.get(name)) is None:
+            variable = names[self.checked(name)] = (f'v{len(names)}', type)
+        return variable
+
+    def generate(self):
+        # Name -> (local, declared type or None if undeclared) of each variable set so far
+        lines, names = [], {}
+        node = self.ast
+        if isinstance(node, Program):
+            for name, type in node.symbols.items():
+                local, _ = self.variable(name, type, names)
+                lines.append(f'{local} = {0 if type == INTEGER else 0.0}')
+            node = node.block
+        if not isinstance(node, Compound):
+            lines.append(f'return {self.expression(node, names, lines)}')
+        else:
+            self.statements(node, names, lines)
+            table = ', '.join(f'{name!r}: {local}' for name, (local, _) in names.items())
+            lines.append(f'return {{{table}}}')
+        return 'def program():\n' + ''.join(f'    {line}\n' for line in lines)
+
+    def statements(self, node, names, lines):
+        """Lines of the statements under compound statement node, without recursing"""
+        pending = [iter(node.children)]
+        while pending:
+            for child in pending[-1]:
+                if isinstance(child, Compound):
+                    pending.append(iter(child.children))
+                    break
+                elif isinstance(child, Assignment):
+                    expression = self.expression(child.right, names, lines)
+                    name = child.left.value
+                    local, type = self.variable(name, None, names)
+                    if type == INTEGER:
+                        expression = f'store_integer({name!r}, {expression})'
+                    elif type is not None:
+                        expression = f'float({expression})'
+                    lines.append(f'{local} = {expression}')
+            else:
+                pending.pop()
+
+    def expression(self, node, names, lines):
+        """
+        Python expression for node. Subexpressions nested too deep are
+        assigned to temporaries first, appended to lines
+        """
+        # (source, depth) of each finished subexpression, built in post-order
+        results, pending = [], [(node, False)]
+        while pending:
+            node, children_done = pending.pop()
+            if isinstance(node, Variable):
+                name = self.checked(node.value)
+                source = names[name][0] if name in names else f'undefined({name!r})'
+                results.append((source, 0))
+            elif isinstance(node, Number):
+                # Literals too long for a float are inf, which has no literal
+                source = repr(node.value) if not isinstance(node.value, float) or math.isfinite(node.value) else f"float('{node.value}')"
+                results.append((source, 0))
+            elif not children_done:
+                pending.append((node, True))
+                if isinstance(node, BinaryOp):
+                    pending.extend(((node.right, False), (node.left, False)))
+                else:
+                    pending.append((node.operand, False))
+            else:
+                if isinstance(node, BinaryOp):
+                    (right, right_depth), (left, left_depth) = results.pop(), results.pop()
+                    source = f'({left} {self.binary_operators[node.op]} {right})'
+                    depth = max(left_depth, right_depth) + 1
+                else:
+                    operand, depth = results.pop()
+                    source, depth = f'({self.unary_operators[node.op]}{operand})', depth + 1
+                if depth >= self.spill_depth:
+                    temporary = f't{len(lines)}'
+                    lines.append(f'{temporary} = {source}')
+                    source, depth = temporary, 0
+                results.append((source, depth))
+        return results[0][0]
+
+
+if __name__ == '__main__':
+    generator = CodeGenerator(Parser(Lexer(sys.stdin.read())).parse_program())
+    print(generator.source)
+    print(generator.compile()())
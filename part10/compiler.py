@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+import os
+import sys
+
+if __name__ == '__main__':
+    # Run as a script, the shared lexer core, lexcore.py, is found at the top
+    # of the repository
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import INTEGER, REAL
+from interpreter import Interpreter
+from lexer import Lexer
+from parser import Parser
+
+
+"""
+Closure compilation
+
+Turns the AST once into nested closures, each bound to its operator
+function, constants and child closures, that run against a results table.
+Running the program again is a call of the root closure, with no visitor
+dispatch or operator lookups left.
+
+Nested compound statements of a lazily parsed tree are compiled the first
+time they run, so their syntax errors still show up then.
+"""
+class Compiler:
+    def __init__(self, ast):
+        self.ast = ast
+        # Name -> store function of each declared variable
+        self.stores = {}
+
+    def compile(self):
+        """
+        Callable running the program on a new table, returning the same as
+        Interpreter.interpret
+        """
+        code = self.visit(self.ast)
+
+        def run():
+            return code({})
+
+        return run
+
+    def visit(self, node):
+        return getattr(self, f'visit_{node.name}')(node)
+
+    def visit_binaryop(self, node):
+        operation = Interpreter.binary_codes[node.op]
+        left, right = self.visit(node.left), self.visit(node.right)
+        # Constant operands are captured as they are rather than called
+        if node.right.name == 'number':
+            value = node.right.value
+            return lambda table: operation(left(table), value)
+        if node.left.name == 'number':
+            value = node.left.value
+            return lambda table: operation(value, right(table))
+        return lambda table: operation(left(table), right(table))
+
+    def visit_unaryop(self, node):
+        operation, operand = Interpreter.unary_codes[node.op], self.visit(node.operand)
+        return lambda table: operation(operand(table))
+
+    def visit_number(self, node):
+        value = node.value
+        return lambda table: value
+
+    def visit_variable(self, node):
+        name = node.value
+
+        def variable(table):
+            try:
+                return table[name]
+            except KeyError:
+                raise NameError(f'{name} is not defined')
+
+        return variable
+
+    def visit_assignment(self, node):
+        name, expr = node.left.value, self.visit(node.right)
+        if (store := self.stores.get(name)) is not None:
+            def assignment(table):
+                value = table[name] = store(name, expr(table))
+                return value
+        else:
+            def assignment(table):
+                value = table[name] = expr(table)
+                return value
+        return assignment
+
+    def visit_compound(self, node):
+        children = tuple(self.visit(child) for child in node.children)
+
+        def compound(table):
+            for child in children:
+                child(table)
+            return table
+
+        return compound
+
+    def visit_lazycompound(self, node):
+        code = None
+
+        def compound(table):
+            nonlocal code
+            if code is None:
+                code = self.visit_compound(node)
+            return code(table)
+
+        return compound
+
+    def visit_program(self, node):
+        stores = {INTEGER: Interpreter.store_integer, REAL: Interpreter.store_real}
+        self.stores = {name: stores[type] for name, type in node.symbols.items()}
+        storage, block = node.symbols.storage(), self.visit(node.block)
+
+        def program(table):
+            table.update(storage)
+            return block(table)
+
+        return program
+
+    def visit_noop(self, node):
+        return lambda table: None
+
+
+if __name__ == '__main__':
+    print(Compiler(Parser(Lexer(sys.stdin.read())).parse_program()).compile()())
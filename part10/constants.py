@@ -1,7 +1,17 @@
 EOF = 'EOF'
-NUMBER, PLUS, MINUS, TIMES, DIVIDE, INTEGER_DIVIDE, LPAREN, RPAREN = (
-    'NUMBER', 'PLUS', 'MINUS', 'TIMES', 'DIVIDE', 'INTEGER_DIVIDE',  'LPAREN', 'RPAREN',
+INTEGER_CONST, REAL_CONST = 'INTEGER_CONST', 'REAL_CONST'
+PLUS, MINUS, TIMES, DIVIDE, INTEGER_DIVIDE, LPAREN, RPAREN = (
+    'PLUS', 'MINUS', 'TIMES', 'DIVIDE', 'INTEGER_DIVIDE',  'LPAREN', 'RPAREN',
 )
 ASSIGN, VARIABLE, SEMICOLON, COLON, DOT, COMMA = 'ASSIGN', 'VARIABLE', 'SEMICOLON', 'COLON', 'DOT', 'COMMA'
 # Pascal is case-insensitive so reserved words are lower-case
 BEGIN, END, DIV, VAR, PROGRAM, INTEGER, REAL, LBRACE, RBRACE = 'begin', 'end', 'div', 'var', 'program', 'integer', 'real', 'LBRACE', 'RBRACE'
+
+# Binding powers of the infix operators for the Pratt parser, higher binds
+# tighter. Prefix + and - bind tighter than any of them
+BINDING_POWERS = {PLUS: 10, MINUS: 10, TIMES: 20, DIVIDE: 20, INTEGER_DIVIDE: 20}
+PREFIX_BINDING_POWER = 30
+
+# Operators as stored in the AST: the small int code of each is its index
+OPERATORS = (PLUS, MINUS, TIMES, DIVIDE, INTEGER_DIVIDE, ASSIGN)
+OPERATOR_CODES = {operator: code for code, operator in enumerate(OPERATORS)}
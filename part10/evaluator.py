@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import os
+import sys
+
+if __name__ == '__main__':
+    # Run as a script, the shared lexer core, lexcore.py, is found at the top
+    # of the repository
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import (
+    PLUS, MINUS, LPAREN, RPAREN, INTEGER_CONST, REAL_CONST, VARIABLE,
+    BINDING_POWERS, PREFIX_BINDING_POWER,
+)
+from interpreter import Interpreter
+from lexer import Lexer
+from streaming import StreamLexer
+
+
+"""
+Streaming evaluation
+
+Shunting-yard over the expr grammar: values and pending operators are kept
+on two stacks and reduced as soon as precedence allows, without building a
+tree. Memory grows with the nesting depth of the expression, never with its
+length, and nothing recurses, so nesting is only limited by memory.
+"""
+class Evaluator:
+    binary_operations = Interpreter.binary_operations
+    unary_operations = Interpreter.unary_operations
+
+    # Opening parenthesis on the operator stack, below every operator
+    parenthesis = (0, None, None)
+
+    def __init__(self, tokens, variables=None):
+        """
+        tokens is an iterable of Tokens, e.g. StreamLexer(file).tokenize().
+        variables maps variable names to their values
+        """
+        self.tokens = iter(tokens)
+        self.variables = {} if variables is None else variables
+        self.current_token = None
+
+    def get_next_token(self):
+        self.current_token = next(self.tokens, Lexer.end_of_file)
+
+    def reduce(self, values, operators, power):
+        """Apply the pending operators that bind at least as tight as power"""
+        while operators[-1][0] >= power:
+            _, arity, operation = operators.pop()
+            if arity == 1:
+                values.append(operation(values.pop()))
+            else:
+                right = values.pop()
+                values.append(operation(values.pop(), right))
+
+    def evaluate(self):
+        """
+        Value of the expression at the start of tokens. Stops at the first
+        token that can not continue it, left in current_token
+        """
+        values, operators, depth = [], [self.parenthesis], 0
+        self.get_next_token()
+        while True:
+            # Operand, after any prefix operators and opening parentheses
+            token = self.current_token
+            if token.type in (PLUS, MINUS):
+                operators.append((PREFIX_BINDING_POWER, 1, self.unary_operations[token.type]))
+            elif token.type == LPAREN:
+                operators.append(self.parenthesis)
+                depth += 1
+            elif token.type in (INTEGER_CONST, REAL_CONST):
+                values.append(token.value)
+            elif token.type == VARIABLE:
+                try:
+                    values.append(self.variables[token.value])
+                except KeyError:
+                    raise NameError(f'{token.value} is not defined')
+            else:
+                raise TypeError(f'Expected one of (PLUS, MINUS, LPAREN, INTEGER_CONST, REAL_CONST, VARIABLE), got {token.type}')
+            self.get_next_token()
+            if token.type not in (INTEGER_CONST, REAL_CONST, VARIABLE):
+                continue
+
+            # Closing parentheses, then an infix operator or the end
+            while self.current_token.type == RPAREN and depth:
+                self.reduce(values, operators, 1)
+                operators.pop()
+                depth -= 1
+                self.get_next_token()
+
+            if (power := BINDING_POWERS.get(self.current_token.type)) is None:
+                break
+            self.reduce(values, operators, power)
+            operators.append((power, 2, self.binary_operations[self.current_token.type]))
+            self.get_next_token()
+
+        if depth:
+            raise TypeError(f'Expected {RPAREN}, got {self.current_token.type}')
+        self.reduce(values, operators, 1)
+        return values.pop()
+
+
+if __name__ == '__main__':
+    # Evaluate an expression piped in on stdin, however long or deep
+    print(Evaluator(StreamLexer(sys.stdin).tokenize()).evaluate())
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+
+from array import array
+import mmap
+import struct
+import sys
+
+from ast import BinaryOp, UnaryOp, NoOp, Number, Assignment, Variable, Compound, Program
+from constants import INTEGER_CONST, REAL_CONST, VARIABLE, OPERATORS
+from interpreter import Interpreter
+from lexer import Token
+from symbols import SymbolTable
+
+# Node kinds
+(
+    BINARYOP, UNARYOP, INTEGER_NUMBER, REAL_NUMBER, VARIABLE_NODE, ASSIGNMENT, NOOP, COMPOUND,
+    DECLARATION, PROGRAM_NODE, BIG_INTEGER_NUMBER,
+) = range(11)
+
+
+"""
+Flat AST
+
+A tree is stored in post-order, children before their parents and the root
+last, as parallel typed arrays indexed by node:
+
+kinds       node kind
+ops         operator code of BinaryOp, UnaryOp and Assignment,
+            type of a declaration as its index in SymbolTable.types
+a           BinaryOp: left node    UnaryOp: operand node
+            Number: constant pool  Variable, Assignment: name pool
+            big integer Number: its decimal digits in the name pool
+            Compound: first entry in children
+            Declaration, Program: name pool
+b           BinaryOp: right node   Assignment: expression node
+            Compound: number of children
+            Program: number of declarations
+
+plus a children array of node indexes and pools of integers, reals and
+names. Integer literals that do not fit the int64 pool are kept as
+decimal strings in the name pool, under their own node kind. Post-order
+is also execution order, so a program runs in a single pass over the
+arrays.
+
+A Program is preceded by one node per declared variable, then its block.
+
+The binary format is a header followed by each array, 8-byte aligned, in
+little-endian order. A buffer or mmap of it is used in place.
+"""
+class FlatTree:
+    magic = b'PASFLAT\0'
+    version = 3
+    # magic, version, node, child, integer, real and name counts, name bytes
+    header = struct.Struct('<8sI6I')
+    # Names are UTF-8 in one blob, name i spans name_offsets[i:i + 2]
+    sections = (
+        ('integers', 'q'), ('reals', 'd'),
+        ('a', 'I'), ('b', 'I'), ('children', 'I'), ('name_offsets', 'I'),
+        ('kinds', 'B'), ('ops', 'B'), ('name_bytes', 'B'),
+    )
+
+    def __init__(self):
+        self.kinds, self.ops = array('B'), array('B')
+        self.a, self.b, self.children = array('I'), array('I'), array('I')
+        self.integers, self.reals = array('q'), array('d')
+        self.name_offsets, self.name_bytes = array('I', [0]), array('B')
+        self.pool = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def root(self):
+        return len(self.kinds) - 1
+
+    def name(self, index):
+        offsets = self.name_offsets
+        return str(memoryview(self.name_bytes)[offsets[index]:offsets[index + 1]], 'utf-8')
+
+    def constant(self, pool, value):
+        """Index of value in the pool array, added the first time"""
+        # repr tells 0.0 from -0.0 and 1 from 1.0
+        key = (pool.typecode, repr(value))
+        if (index := self.pool.get(key)) is None:
+            index = self.pool[key] = len(pool)
+            pool.append(value)
+        return index
+
+    def name_index(self, name, kind='name'):
+        """Index of a string in the name pool, added the first time"""
+        key = (kind, name)
+        if (index := self.pool.get(key)) is None:
+            index = self.pool[key] = len(self.name_offsets) - 1
+            self.name_bytes.frombytes(name.encode('utf-8'))
+            self.name_offsets.append(len(self.name_bytes))
+        return index
+
+    def append(self, kind, op=0, a=0, b=0):
+        self.kinds.append(kind)
+        self.ops.append(op)
+        self.a.append(a)
+        self.b.append(b)
+        return len(self.kinds) - 1
+
+    @classmethod
+    def from_ast(cls, tree):
+        flat = cls()
+        # Nodes in reverse post-order, without recursing
+        order, pending = [], [tree]
+        while pending:
+            node = pending.pop()
+            order.append(node)
+            if isinstance(node, Assignment):
+                pending.append(node.right)
+            elif isinstance(node, BinaryOp):
+                pending.extend((node.left, node.right))
+            elif isinstance(node, UnaryOp):
+                pending.append(node.operand)
+            elif isinstance(node, Compound):
+                pending.extend(node.children)
+            elif isinstance(node, Program):
+                # Declarations come first in execution order
+                pending.extend((*node.symbols.items(), node.block))
+
+        # Indexes of the nodes not yet taken by their parent
+        indexes = []
+        for node in reversed(order):
+            if isinstance(node, tuple):
+                name, type = node
+                index = flat.append(DECLARATION, SymbolTable.types.index(type), flat.name_index(name))
+            elif isinstance(node, Program):
+                # The block and declarations are at index - 1 and before
+                del indexes[len(indexes) - len(node.symbols) - 1:]
+                index = flat.append(PROGRAM_NODE, a=flat.name_index(node.identifier), b=len(node.symbols))
+            elif isinstance(node, Assignment):
+                index = flat.append(ASSIGNMENT, node.op, flat.name_index(node.left.value), indexes.pop())
+            elif isinstance(node, BinaryOp):
+                right = indexes.pop()
+                index = flat.append(BINARYOP, node.op, indexes.pop(), right)
+            elif isinstance(node, UnaryOp):
+                index = flat.append(UNARYOP, node.op, indexes.pop())
+            elif isinstance(node, Variable):
+                index = flat.append(VARIABLE_NODE, a=flat.name_index(node.value))
+            elif isinstance(node, Number):
+                if isinstance(node.value, float):
+                    index = flat.append(REAL_NUMBER, a=flat.constant(flat.reals, node.value))
+                elif -1 << 63 <= node.value < 1 << 63:
+                    index = flat.append(INTEGER_NUMBER, a=flat.constant(flat.integers, node.value))
+                else:
+                    index = flat.append(BIG_INTEGER_NUMBER, a=flat.name_index(str(node.value), 'integer'))
+            elif isinstance(node, Compound):
+                count = len(node.children)
+                index = flat.append(COMPOUND, a=len(flat.children), b=count)
+                if count:
+                    flat.children.extend(indexes[-count:])
+                    del indexes[-count:]
+            else:
+                index = flat.append(NOOP)
+            indexes.append(index)
+        return flat
+
+    def to_ast(self):
+        nodes, declarations = [], []
+        kinds, ops, a, b, children = self.kinds, self.ops, self.a, self.b, self.children
+        for index in range(len(kinds)):
+            kind = kinds[index]
+            if kind == BINARYOP:
+                node = BinaryOp(Token(OPERATORS[ops[index]], None), nodes[a[index]], nodes[b[index]])
+            elif kind == UNARYOP:
+                node = UnaryOp(Token(OPERATORS[ops[index]], None), nodes[a[index]])
+            elif kind == INTEGER_NUMBER:
+                node = Number(Token(INTEGER_CONST, self.integers[a[index]]))
+            elif kind == REAL_NUMBER:
+                node = Number(Token(REAL_CONST, self.reals[a[index]]))
+            elif kind == BIG_INTEGER_NUMBER:
+                node = Number(Token(INTEGER_CONST, int(self.name(a[index]))))
+            elif kind == VARIABLE_NODE:
+                node = Variable(Token(VARIABLE, self.name(a[index])))
+            elif kind == ASSIGNMENT:
+                variable = Variable(Token(VARIABLE, self.name(a[index])))
+                node = Assignment(Token(OPERATORS[ops[index]], None), variable, nodes[b[index]])
+            elif kind == COMPOUND:
+                node = Compound([nodes[child] for child in children[a[index]:a[index] + b[index]]])
+            elif kind == DECLARATION:
+                node = None
+                declarations.append((self.name(a[index]), SymbolTable.types[ops[index]]))
+            elif kind == PROGRAM_NODE:
+                symbols = SymbolTable(declarations[len(declarations) - b[index]:])
+                node = Program(self.name(a[index]), symbols, nodes[index - 1])
+            else:
+                node = NoOp()
+            nodes.append(node)
+        return nodes[-1] if nodes else None
+
+    def interpret(self):
+        """Run the tree in one pass over the arrays, like Interpreter"""
+        binary, unary = Interpreter.binary_codes, Interpreter.unary_codes
+        type_stores = (Interpreter.store_integer, Interpreter.store_real)
+        kinds, ops, a = self.kinds, self.ops, self.a
+        table, names, values, stores = {}, {}, [], {}
+        for index in range(len(kinds)):
+            kind = kinds[index]
+            if kind == BINARYOP:
+                right = values.pop()
+                values.append(binary[ops[index]](values.pop(), right))
+            elif kind == UNARYOP:
+                values.append(unary[ops[index]](values.pop()))
+            elif kind == INTEGER_NUMBER:
+                values.append(self.integers[a[index]])
+            elif kind == REAL_NUMBER:
+                values.append(self.reals[a[index]])
+            elif kind == BIG_INTEGER_NUMBER:
+                values.append(int(self.name(a[index])))
+            elif kind == VARIABLE_NODE:
+                if (name := names.get(a[index])) is None:
+                    name = names[a[index]] = self.name(a[index])
+                try:
+                    values.append(table[name])
+                except KeyError:
+                    raise NameError(f'{name} is not defined')
+            elif kind == ASSIGNMENT:
+                if (name := names.get(a[index])) is None:
+                    name = names[a[index]] = self.name(a[index])
+                if (store := stores.get(name)) is not None:
+                    table[name] = store(name, values.pop())
+                else:
+                    table[name] = values.pop()
+            elif kind == DECLARATION:
+                name, type = self.name(a[index]), SymbolTable.types[ops[index]]
+                table[name] = SymbolTable.zeros[type]
+                stores[name] = type_stores[ops[index]]
+        # The value of an expression, the variables of a program
+        return values.pop() if values else table
+
+    def to_bytes(self):
+        counts = (
+            len(self.kinds), len(self.children), len(self.integers), len(self.reals),
+            len(self.name_offsets) - 1, len(self.name_bytes),
+        )
+        parts = [self.header.pack(self.magic, self.version, *counts)]
+        size = self.header.size
+        for name, _ in self.sections:
+            data = getattr(self, name)
+            if sys.byteorder == 'big':
+                data = array(data.typecode, data)
+                data.byteswap()
+            padding = -size % 8
+            parts.extend((bytes(padding), data.tobytes()))
+            size += padding + len(data) * data.itemsize
+        return b''.join(parts)
+
+    def write(self, path):
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Tree over buffer, e.g. an mmap, whose arrays are views into it"""
+        view = memoryview(buffer).cast('B')
+        if len(view) < cls.header.size:
+            raise ValueError('Not a flat AST: too short')
+        magic, version, nodes, children, integers, reals, names, name_bytes = cls.header.unpack_from(view)
+        if magic != cls.magic:
+            raise ValueError('Not a flat AST: bad magic number')
+        if version != cls.version:
+            raise ValueError(f'Unsupported flat AST version {version}')
+        lengths = {
+            'integers': integers, 'reals': reals, 'a': nodes, 'b': nodes, 'children': children,
+            'name_offsets': names + 1, 'kinds': nodes, 'ops': nodes, 'name_bytes': name_bytes,
+        }
+        flat = cls.__new__(cls)
+        offset = cls.header.size
+        for name, typecode in cls.sections:
+            offset += -offset % 8
+            end = offset + lengths[name] * array(typecode).itemsize
+            if end > len(view):
+                raise ValueError('Not a flat AST: truncated')
+            data = view[offset:end].cast(typecode)
+            if sys.byteorder == 'big':
+                # Only big-endian machines pay for a copy
+                data = array(typecode, data)
+                data.byteswap()
+            setattr(flat, name, data)
+            offset = end
+        return flat
+
+    @classmethod
+    def read(cls, path):
+        """Tree over a read-only mmap of the file at path"""
+        with open(path, 'rb') as file:
+            return cls.from_buffer(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
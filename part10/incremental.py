@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+from constants import BEGIN
+from parser import Parser
+from tokenstream import TokenStream
+
+
+"""
+Incremental parsing
+
+A program is kept as a TokenStream and its tree. An edit re-lexes only the
+damaged tokens (see TokenStream.edit) and reparses only the innermost
+compound statement around them, whose node is updated in place, so the
+rest of the tree is reused as it is.
+"""
+class SpanParser(Parser):
+    """Parser recording the compound statement built at each BEGIN token index"""
+    def __init__(self, *args, **kwargs):
+        self.compounds = {}
+        super().__init__(*args, **kwargs)
+
+    def compound_statement(self):
+        start = self.index
+        result = super().compound_statement()
+        self.compounds[start] = result
+        return result
+
+
+class IncrementalParser:
+    def __init__(self, text, engine='descent'):
+        self.stream = TokenStream(text)
+        self.engine = engine
+        self.tree = None
+        self.parse()
+
+    @property
+    def text(self):
+        return self.stream.text
+
+    def parse(self):
+        """Parse the whole program again"""
+        self.tree = None
+        parser = SpanParser(self.stream, engine=self.engine)
+        self.tree = parser.parse_program()
+        self.compounds = parser.compounds
+        self.symbols = parser.symbols
+        return self.tree
+
+    def enclosing(self, offset, removed):
+        """
+        BEGIN token index of the innermost compound statement strictly
+        between whose BEGIN and END the edited chars lie, None if there is
+        none. Tokens touching the edit may be re-lexed, so they do not count
+        """
+        stream, found = self.stream, None
+        for begin in self.compounds:
+            end = stream.block_end(begin)
+            if stream.ends[begin] < offset and offset + removed < stream.starts[end]:
+                if found is None or begin > found:
+                    found = begin
+        return found
+
+    def edit(self, offset, removed, inserted):
+        """
+        Replace removed chars at offset with inserted, and return the tree
+        node that was reparsed: the innermost compound statement around the
+        edit, or the whole program
+        """
+        if self.tree is None:
+            self.stream.edit(offset, removed, inserted)
+            return self.parse()
+
+        begin = self.enclosing(offset, removed)
+        if begin is None:
+            self.stream.edit(offset, removed, inserted)
+            return self.parse()
+
+        stream = self.stream
+        end, count = stream.block_end(begin), len(stream)
+        stream.edit(offset, removed, inserted)
+        delta = len(stream) - count
+        new_end = end + delta
+
+        # The block must still be one compound statement ending at the same
+        # END, otherwise the structure around it changed too
+        if stream.kinds[begin] != stream.kind_codes[BEGIN] or stream.block_end(begin) != new_end:
+            return self.parse()
+        parser = SpanParser(stream, engine=self.engine, start=begin)
+        parser.symbols = self.symbols
+        try:
+            block = parser.compound_statement()
+        except BaseException:
+            # Any failure leaves the tree half edited, the next edit parses again
+            self.tree = None
+            raise
+        if parser.index != new_end + 1:
+            return self.parse()
+
+        node = self.compounds[begin]
+        node.children = block.children
+        parser.compounds[begin] = node
+        compounds = {}
+        for start, compound in self.compounds.items():
+            if start < begin:
+                compounds[start] = compound
+            elif start > end:
+                compounds[start + delta] = compound
+        compounds.update(parser.compounds)
+        self.compounds = compounds
+        return node
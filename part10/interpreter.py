@@ -3,15 +3,22 @@
 import logging
 
 import operator
+import os
+import sys
 import traceback
 
+if __name__ == '__main__':
+    # Run as a script, the shared lexer core, lexcore.py, is found at the top
+    # of the repository
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from ast import (
     BinaryOp, UnaryOp, NoOp,
     Number, Assignment, Variable,
     Compound
 )
 from constants import (
-    PLUS, MINUS, TIMES, DIVIDE, INTEGER_DIVIDE,
+    PLUS, MINUS, TIMES, DIVIDE, INTEGER_DIVIDE, OPERATORS, INTEGER, REAL,
 )
 from lexer import Lexer
 from parser import Parser
@@ -33,9 +40,25 @@ class Interpreter:
         MINUS: lambda x: -x,
     }
 
+    # The same indexed by the operator codes stored in the AST
+    binary_codes = tuple(map(binary_operations.get, OPERATORS))
+    unary_codes = tuple(map(unary_operations.get, OPERATORS))
+
+    @staticmethod
+    def store_integer(name, value):
+        if not isinstance(value, int):
+            raise TypeError(f'Cannot assign REAL {value} to INTEGER variable {name}')
+        return value
+
+    @staticmethod
+    def store_real(name, value):
+        return float(value)
+
     def __init__(self, ast):
         self.ast = ast
         self.table = {}
+        # Name -> store function of each declared variable
+        self.stores = {}
 
     def interpret(self):
         return self.visit(self.ast)
@@ -44,16 +67,13 @@ class Interpreter:
         return getattr(self, f'visit_{node.name}')(node)
 
     def visit_binaryop(self, node):
-        return self.binary_operations[node.token.type](self.visit(node.left), self.visit(node.right))
+        return self.binary_codes[node.op](self.visit(node.left), self.visit(node.right))
 
     def visit_unaryop(self, node):
-        return self.unary_operations[node.token.type](self.visit(node.operand))
+        return self.unary_codes[node.op](self.visit(node.operand))
 
     def visit_number(self, node):
-        try:
-            return int(node.token.value)
-        except ValueError:
-            return float(node.token.value)
+        return node.value
 
     def visit_compound(self, node):
         for child in node.children:
@@ -62,9 +82,23 @@ class Interpreter:
         logging.debug(f'Result: {self.table}')
         return self.table
 
+    visit_lazycompound = visit_compound
+
+    def visit_program(self, node):
+        """
+        Declared variables are allocated up front, and each gets the store
+        function of its type, picked once here
+        """
+        stores = {INTEGER: self.store_integer, REAL: self.store_real}
+        self.stores = {name: stores[type] for name, type in node.symbols.items()}
+        self.table.update(node.symbols.storage())
+        return self.visit(node.block)
+
     def visit_assignment(self, node):
         var_value = node.left.value
         expr_value = self.visit(node.right)
+        if (store := self.stores.get(var_value)) is not None:
+            expr_value = store(var_value, expr_value)
         logging.debug(f'Assigning {var_value} = {expr_value}')
         self.table[var_value] = expr_value
         return expr_value
@@ -1,14 +1,19 @@
 #!/usr/bin/env python
 
 from collections import namedtuple
+import re
 import string
 import logging
 
 from constants import (
     PLUS, MINUS, TIMES, DIVIDE, INTEGER_DIVIDE, LPAREN, RPAREN,
-    NUMBER, VARIABLE, ASSIGN, VAR, INTEGER, REAL, PROGRAM,
+    INTEGER_CONST, REAL_CONST, VARIABLE, ASSIGN, VAR, INTEGER, REAL, PROGRAM,
     SEMICOLON, BEGIN, END, DOT, DIV, EOF, COMMA, COLON,
 )
+# The shared core is lexcore.py at the top of the repository, which the
+# entry points put on the path
+from lexcore import TableLexer
+from source import SourceMap
 
 Token = namedtuple('Token', ('type', 'value'))
 
@@ -16,7 +21,7 @@ Token = namedtuple('Token', ('type', 'value'))
 """
 Lexical Analysis
 """
-class Lexer:
+class Lexer(TableLexer):
     operations = {
         '+': Token(PLUS, '+'),
         '-': Token(MINUS, '-'),
@@ -42,16 +47,84 @@ class Lexer:
         REAL: Token(REAL, REAL),
     }
 
+    symbols = {
+        **operations,
+        ':=': assignment_token,
+        ';': semicolon,
+        '.': dot,
+        ':': colon,
+        ',': comma,
+    }
+
     acceptable_var_starters = string.ascii_letters + '_'
     acceptable_var_chars = acceptable_var_starters + string.digits
 
-    def __init__(self, text):
-        self.text = text
-        self.reset()
+    # Tables for the regex engine from the shared core. Unterminated
+    # comments run to the end of the text like in the char walker
+    identifier_regex = f'[{acceptable_var_starters}][{acceptable_var_chars}]*'
+    number_regex = r'\d[\d.]*'
+    comment_regex = r'\{[^}]*\}?'
+
+    # Whole identifiers and numbers are matched in one step and sliced out
+    # of the text, so lexing stays linear however long a token is
+    identifier_pattern = re.compile(identifier_regex)
+    number_pattern = re.compile(number_regex)
+
+    engines = ('chars', 'regex')
+
+    non_ascii = re.compile(rb'[\x80-\xff]')
+
+    def __init__(self, text, engine='regex', identifiers=None):
+        """
+        text is a str, or bytes-like such as bytes, a memoryview or an mmap.
+        ASCII bytes are lexed in place by the bytes engine; anything else is
+        decoded as UTF-8 and lexed by engine.
+
+        identifiers maps identifier spellings to their tokens; pass the same
+        dict to several lexers to share it across a batch of programs
+        """
+        if engine not in self.engines:
+            raise ValueError(f'Unknown lexer engine {engine}')
+        if not isinstance(text, str):
+            view = memoryview(text).cast('B')
+            if self.non_ascii.search(view):
+                text = str(view, 'utf-8')
+            else:
+                text, engine = view, 'bytes'
+        self.engine = engine
+        self.source_map = None
+        # (line, column) where text starts, when it is a piece of a source
+        self.origin = (1, 1)
+        super().__init__(text, identifiers)
 
     def reset(self):
-        self.pos = 0
-        self.current_char = self.text[self.pos]
+        super().reset()
+        self.current_char = self.text[self.pos:self.pos + 1]
+
+    def position(self, index):
+        """1-based (line, column) where token number index starts"""
+        offset = self.offsets[index] if index < len(self.offsets) else len(self.text)
+        return self.offset_position(offset)
+
+    def offset_position(self, offset):
+        """
+        1-based (line, column) of offset in text. Helpers lexing text they
+        are handed, like TokenStream, set text and origin to the piece they lex
+        """
+        text = self.text
+        if self.source_map is None or self.mapped is not text or self.source_map.origin != self.origin:
+            self.source_map = SourceMap(text if isinstance(text, str) else bytes(text), self.origin)
+            self.mapped = text
+        return self.source_map.position(offset)
+
+    def unexpected(self, char, offset):
+        line, column = self.offset_position(offset)
+        raise ValueError(f'Unexpected character {char} at line {line}, column {column}')
+
+    def invalid_literal(self, number, offset):
+        # Only integers fail to convert, past the int/str digit limit
+        line, column = self.offset_position(offset)
+        raise ValueError(f'Integer literal of {len(number)} digits is too long at line {line}, column {column}') from None
 
     def advance(self):
         self.pos += 1
@@ -60,25 +133,31 @@ class Lexer:
         except IndexError:
             self.current_char = ''
 
+    def jump(self, pos):
+        self.pos = pos
+        self.current_char = self.text[pos:pos + 1]
+
     def peek(self):
         try:
             return self.text[self.pos + 1]
         except IndexError:
             return ''
 
+    def match(self, pattern):
+        """Slice of the text pattern matches at pos, advancing past it"""
+        if (match := pattern.match(self.text, self.pos)):
+            self.jump(match.end())
+            return match.group()
+        return ''
+
     def _id(self):
-        result = ''
-        if self.current_char in self.acceptable_var_starters:
-            while self.current_char and self.current_char in self.acceptable_var_chars:
-                result += self.current_char
-                self.advance()
-        return result
+        return self.match(self.identifier_pattern)
 
     def identifier(self):
-        identifier = self._id().lower()
-        if identifier:
-            logging.debug("* ID *: {}".format(identifier))
-            return self.reserved_words.get(identifier, Token(VARIABLE, identifier))
+        if (spelling := self._id()):
+            token = self.identifier_token(spelling)
+            logging.debug('* ID *: %s', token.value)
+            return token
 
     def assignment(self):
         if self.current_char == ':':
@@ -90,25 +169,31 @@ class Lexer:
                 return token
 
     def number(self):
-        result = ''
-        decimal_found = self.current_char == '.'
-        while self.current_char.isdigit() or (not decimal_found and self.current_char == '.'):
-            result += self.current_char
-            self.advance()
-
-        return Token(NUMBER, result) if result else None
+        start = self.pos
+        if not (result := self.match(self.number_pattern)):
+            return None
+        try:
+            return self.literal(result)
+        except ValueError:
+            return self.invalid_literal(result, start)
 
     def get_next_token(self):
+        if self.engine != 'chars':
+            return super().get_next_token()
+        return self.next_char_token()
+
+    def next_char_token(self):
+        """Char walker: dispatch on the current char, skipping spaces and comments"""
         while self.current_char:
+            self.token_start = self.pos
             # Skip spaces
             if self.current_char.isspace():
                 self.advance()
 
             # Skip comments
             elif self.current_char == '{':
-                while self.current_char and self.current_char != '}':
-                    self.advance()
-                self.advance()
+                end = self.text.find('}', self.pos)
+                self.jump(end + 1 if end != -1 else len(self.text))
 
             # multi-char tokens which advance self.current_char
             elif (identifier := self.identifier()):
@@ -140,12 +225,32 @@ class Lexer:
                 return self.dot
 
             else:
-                raise ValueError(f'Unexpected character {self.current_char}')
+                self.unexpected(self.current_char, self.pos)
 
         # End of file
+        self.token_start = self.pos
         return self.end_of_file
 
+    @staticmethod
+    def literal(number):
+        """Typed literal token holding the converted value of number"""
+        if '.' in number:
+            return Token(REAL_CONST, float(number))
+        return Token(INTEGER_CONST, int(number))
+
+    @staticmethod
+    def variable(name):
+        return Token(VARIABLE, name)
+
     def tokenize(self):
+        if self.engine != 'chars':
+            return super().tokenize()
+        return self.walk()
+
+    def walk(self):
+        """Char-at-a-time engine driven by next_char_token"""
         self.reset()
-        while (token := self.get_next_token()).type != EOF:
+        offsets = self.offsets
+        while (token := self.next_char_token()).type != EOF:
+            offsets.append(self.token_start)
             yield token
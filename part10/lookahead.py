@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+Lookahead buffer
+
+Tokens pulled straight from a Lexer, without the tokenize() generator, into
+a ring buffer so the next few can be peeked at before they are taken. The
+lexer records token offsets as tokenize() does, so it still resolves token
+indexes to source positions.
+"""
+class TokenBuffer:
+    def __init__(self, lexer, size=4):
+        """size is how many tokens peek() can see ahead, a power of two"""
+        if size < 1 or size & (size - 1):
+            raise ValueError(f'Lookahead size must be a power of two, got {size}')
+        self.lexer = lexer
+        self.ring = [None] * size
+        self.mask = size - 1
+        # Tokens put in and taken out of the ring so far
+        self.head = self.tail = 0
+        lexer.reset()
+        self.end_of_file = lexer.end_of_file
+        if lexer.engine == 'chars':
+            self.lex = self.lex_chars
+        else:
+            self.matches = lexer.pattern.finditer(lexer.text)
+            self.matched_token = lexer.matched_token
+            self.add_offset = lexer.offsets.append
+            self.pop = self.pop_match
+
+    def lex(self):
+        """Next token of the master pattern, end_of_file from the end on"""
+        for match in self.matches:
+            if (token := self.matched_token(match)) is not self.end_of_file:
+                self.add_offset(match.start(match.lastindex))
+            return token
+        return self.end_of_file
+
+    def lex_chars(self):
+        lexer = self.lexer
+        if (token := lexer.next_char_token()) is not lexer.end_of_file:
+            lexer.offsets.append(lexer.token_start)
+        return token
+
+    def pop(self):
+        """Take the next token"""
+        if self.head != self.tail:
+            token = self.ring[self.head & self.mask]
+            self.head += 1
+            return token
+        return self.lex()
+
+    def pop_match(self):
+        """pop with lex() inlined, as the regex engines take every token through it"""
+        if self.head != self.tail:
+            token = self.ring[self.head & self.mask]
+            self.head += 1
+            return token
+        for match in self.matches:
+            if (token := self.matched_token(match)) is not self.end_of_file:
+                self.add_offset(match.start(match.lastindex))
+            return token
+        return self.end_of_file
+
+    def peek(self, k=0):
+        """Token k places after the one pop() would take next, without taking any"""
+        if not 0 <= k <= self.mask:
+            raise IndexError(f'Can only peek {self.mask + 1} tokens ahead')
+        while self.tail - self.head <= k:
+            self.ring[self.tail & self.mask] = self.lex()
+            self.tail += 1
+        return self.ring[(self.head + k) & self.mask]
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import os
+import re
+
+from source import SourceMap
+from tokenstream import TokenStream
+
+
+"""
+Parallel Lexical Analysis
+"""
+boundary_pattern = re.compile(r'[;\s]')
+
+
+def in_comment(text, pos):
+    """Whether pos is inside a {comment}, which never nest"""
+    return text.rfind('{', 0, pos) > text.rfind('}', 0, pos)
+
+
+def safe_boundary(text, pos):
+    """
+    First offset at or after pos where the text can be split without
+    splitting a token or comment: after a ';' or at whitespace, outside comments
+    """
+    while (match := boundary_pattern.search(text, pos)):
+        boundary = match.start() + (match.group() == ';')
+        if not in_comment(text, boundary):
+            return boundary
+        end = text.find('}', boundary)
+        if end == -1:
+            break
+        pos = end + 1
+    return len(text)
+
+
+def split_source(text, pieces):
+    """Split text into at most pieces chunks at safe boundaries"""
+    size = max(1, -(-len(text) // pieces))
+    chunks, start = [], 0
+    while start < len(text):
+        end = safe_boundary(text, start + size)
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def parallel_tokenize(text, workers=None, pieces=None):
+    """
+    Lex text in a process pool, yielding the same tokens as Lexer.tokenize
+
+    Workers send back compact TokenStreams, which are far cheaper to pickle
+    than lists of Tokens
+    """
+    workers = workers or os.cpu_count()
+    chunks = split_source(text, pieces or workers * 4)
+    # Where each chunk starts, so errors are reported at their place in text
+    origins, origin = [], (1, 1)
+    for chunk in chunks:
+        origins.append(origin)
+        origin = SourceMap.advance(origin, chunk, len(chunk))
+    with ProcessPoolExecutor(workers) as executor:
+        for stream in executor.map(TokenStream, chunks, repeat(None), origins):
+            yield from stream
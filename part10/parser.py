@@ -5,14 +5,18 @@ import logging
 from ast import (
     BinaryOp, UnaryOp, NoOp,
     Number, Assignment, Variable,
-    Compound
+    Compound, LazyCompound, Program,
 )
 from constants import (
     PLUS, MINUS, TIMES, DIVIDE, INTEGER_DIVIDE, LPAREN, RPAREN,
-    NUMBER, VARIABLE, ASSIGN,
-    SEMICOLON, BEGIN, END, DOT, DIV
+    INTEGER_CONST, REAL_CONST, VARIABLE, ASSIGN,
+    SEMICOLON, BEGIN, END, DOT, DIV, EOF,
+    PROGRAM, VAR, COMMA, COLON, INTEGER, REAL,
+    BINDING_POWERS, PREFIX_BINDING_POWER,
 )
 from lexer import Lexer
+from lookahead import TokenBuffer
+from symbols import SymbolTable
 
 """
 Syntax Analysis
@@ -20,13 +24,13 @@ Syntax Analysis
 Context-Free Grammar
 
 program                 : PROGRAM variable SEMI block DOT
+                        | compound_statement DOT
 block                   : declarations compound_statement
 declarations            : VAR (variable_declaration SEMI)+ | empty
-variable_declaration    : variable (COMMA variable)* COLON variable_type
+variable_declaration    : ID (COMMA ID)* COLON variable_type
 variable_type           : INTEGER | REAL
 compound_statement      : BEGIN statement_list END
-statement_list          : statement
-                        | statement SEMI statement_list
+statement_list          : statement (SEMI statement)*
 statement               : compound_statement
                         | assignment_statement
                         | empty
@@ -35,26 +39,95 @@ variable                : ID
 expr                    : term ((PLUS|MINUS)term)*
 term                    : factor ((TIMES|DIVIDE)factor)*
 factor                  : (PLUS|MINUS)factor
-                        |  NUMBER
+                        | INTEGER_CONST
+                        | REAL_CONST
                         | LPAREN expr RPAREN
                         | variable
 empty                   :
+
+A PROGRAM is parsed into a Program with a SymbolTable of its declarations,
+and every variable it uses must be declared. A bare compound statement
+declares nothing and may use any variable.
+
+With lazy=True over a TokenStream, nested compound statements are only
+bracket-matched, and parsed the first time their children are needed.
+Syntax errors inside them are raised then too.
+
+Given a Lexer instead of its tokens, the parser lexes it with tokenize(), or
+with a lookahead pulls tokens from it through a TokenBuffer, and can then
+peek() up to lookahead tokens past the current one.
+
+The 'pratt' engine parses expr with a Pratt parser driven by BINDING_POWERS
+instead of the expr, term and factor rules, and builds the same trees
 """
 class Parser:
-    def __init__(self, tokens):
-        """tokens is a generator"""
-        self.tokens = tokens
+    engines = ('descent', 'pratt')
+
+    def __init__(self, tokens, positions=None, engine='descent', lazy=False, start=0, lookahead=None):
+        """
+        tokens is an iterable of Tokens, e.g. Lexer.tokenize() or a TokenStream,
+        or a Lexer. With a lookahead, a power of two, tokens are pulled from
+        the Lexer for up to lookahead tokens of peek().
+        positions resolves token indexes to source positions for error
+        messages, e.g. the Lexer behind tokens; a Lexer or a TokenStream
+        does it itself.
+        Lazy parsing, or beginning at token number start, needs a TokenStream
+        """
+        if engine not in self.engines:
+            raise ValueError(f'Unknown parser engine {engine}')
+        self.buffer = None
+        if lazy or start:
+            if not hasattr(tokens, 'block_end'):
+                raise ValueError('Lazy parsing, or a start, needs a TokenStream')
+            self.tokens = tokens.tokens(start)
+        elif isinstance(tokens, Lexer) and lookahead is not None:
+            # Slower than tokenize(), so only when peeking is asked for
+            self.buffer = TokenBuffer(tokens, lookahead)
+            self.pop_token = self.buffer.pop
+            self.get_next_token = self.pull_next_token
+        elif isinstance(tokens, Lexer):
+            self.tokens = tokens.tokenize()
+        else:
+            self.tokens = iter(tokens)
+        self.stream = tokens if lazy else None
+        self.engine = engine
+        # Declared variables once a PROGRAM header is seen
+        self.symbols = None
+        if engine == 'pratt':
+            self.expr = self.pratt_expr
+        if positions is None and hasattr(tokens, 'position'):
+            positions = tokens
+        self.positions = positions
         self.current_token = None
+        self.index = start - 1
         self.get_next_token()
 
     def get_next_token(self):
         self.current_token = next(self.tokens, Lexer.end_of_file)
+        self.index += 1
+
+    def pull_next_token(self):
+        """get_next_token for a Lexer, taking the token from the TokenBuffer"""
+        self.current_token = self.pop_token()
+        self.index += 1
+
+    def peek(self, k=1):
+        """Token k places after the current one, when parsing from a Lexer with a lookahead"""
+        if self.buffer is None:
+            raise ValueError('Peeking needs a Lexer and a lookahead to pull tokens with')
+        return self.buffer.peek(k - 1)
+
+    def error(self, message, exception=TypeError):
+        if self.positions is not None:
+            line, column = self.positions.position(self.index)
+            message = f'{message} at line {line}, column {column}'
+        return exception(message)
 
     def eat(self, type):
         if type == self.current_token.type:
             self.get_next_token()
         else:
-            raise TypeError(f'Expected {type}, got {self.current_token.type}')
+            raise self.error(f'Expected {type}, got {self.current_token.type}')
 
     def parse_program(self):
         return self.program()
@@ -109,21 +182,82 @@ class Parser:
             self.eat(LPAREN)
             result = self.expr()
             self.eat(RPAREN)
-        elif self.current_token.type == NUMBER:
+        elif self.current_token.type in (INTEGER_CONST, REAL_CONST):
             result = Number(self.current_token)
-            self.eat(NUMBER)
+            self.eat(self.current_token.type)
         elif self.current_token.type == VARIABLE:
             result = self.variable()
         else:
-            raise TypeError(f'Expected one of (PLUS, MINUS, LPAREN, NUMBER), got {self.current_token.type}')
+            raise self.error(f'Expected one of (PLUS, MINUS, LPAREN, INTEGER_CONST, REAL_CONST, VARIABLE), got {self.current_token.type}')
 
         return result
 
+    def pratt_expr(self, right_power=0):
+        """
+        Expression whose infix operators all bind tighter than right_power.
+        One call per operand, operators of equal power associate to the left
+        """
+        token = self.current_token
+        if token.type in (PLUS, MINUS):
+            self.get_next_token()
+            left = UnaryOp(token, self.pratt_expr(PREFIX_BINDING_POWER))
+        elif token.type in (INTEGER_CONST, REAL_CONST):
+            self.get_next_token()
+            left = Number(token)
+        elif token.type == VARIABLE:
+            left = self.variable()
+        elif token.type == LPAREN:
+            self.get_next_token()
+            left = self.pratt_expr()
+            self.eat(RPAREN)
+        else:
+            raise self.error(f'Expected one of (PLUS, MINUS, LPAREN, INTEGER_CONST, REAL_CONST, VARIABLE), got {token.type}')
+
+        while BINDING_POWERS.get(self.current_token.type, 0) > right_power:
+            token = self.current_token
+            self.get_next_token()
+            left = BinaryOp(token, left, self.pratt_expr(BINDING_POWERS[token.type]))
+        return left
+
     def program(self):
-        result = self.compound_statement()
+        if self.current_token.type == PROGRAM:
+            self.eat(PROGRAM)
+            identifier = self.current_token.value
+            self.eat(VARIABLE)
+            self.eat(SEMICOLON)
+            self.symbols = SymbolTable()
+            self.declarations()
+            result = Program(identifier, self.symbols, self.compound_statement())
+        else:
+            result = self.compound_statement()
         self.eat(DOT)
         return result
 
+    def declarations(self):
+        if self.current_token.type == VAR:
+            self.eat(VAR)
+            self.variable_declaration()
+            self.eat(SEMICOLON)
+            while self.current_token.type == VARIABLE:
+                self.variable_declaration()
+                self.eat(SEMICOLON)
+
+    def variable_declaration(self):
+        names = [self.current_token.value]
+        self.eat(VARIABLE)
+        while self.current_token.type == COMMA:
+            self.eat(COMMA)
+            names.append(self.current_token.value)
+            self.eat(VARIABLE)
+        self.eat(COLON)
+        if (type := self.current_token.type) not in (INTEGER, REAL):
+            raise self.error(f'Expected one of ({INTEGER}, {REAL}), got {type}')
+        for name in names:
+            if name in self.symbols:
+                raise self.error(f'Duplicate declaration of {name}', NameError)
+            self.symbols.define(name, type)
+        self.get_next_token()
+
     def compound_statement(self):
         self.eat(BEGIN)
         result = Compound(self.statement_list())
@@ -132,15 +266,34 @@ class Parser:
         return result
 
     def statement_list(self):
-        result = [self.statement()]
-        if self.current_token.type == SEMICOLON:
+        result = []
+        while True:
+            # Empty statements do nothing, so they are left out
+            if (statement := self.statement()) is not NoOp.instance:
+                result.append(statement)
+            if self.current_token.type != SEMICOLON:
+                return result
             self.eat(SEMICOLON)
-            result.extend(self.statement_list())
-        return result
+
+    def lazy_compound_statement(self):
+        """Compound statement parsed when first entered, skipped for now"""
+        stream, start, engine, symbols = self.stream, self.index, self.engine, self.symbols
+        if (end := stream.block_end(start)) is None:
+            raise self.error(f'Expected {END}, got {EOF}')
+
+        def parse():
+            parser = Parser(stream, engine=engine, lazy=True, start=start)
+            parser.symbols = symbols
+            return parser.compound_statement().children
+
+        self.tokens = stream.tokens(end + 1)
+        self.index = end
+        self.get_next_token()
+        return LazyCompound(parse)
 
     def statement(self):
         if self.current_token.type == BEGIN:
-            result = self.compound_statement()
+            result = self.lazy_compound_statement() if self.stream is not None else self.compound_statement()
         elif self.current_token.type == VARIABLE:
             result = self.assignment_statement()
         else:
@@ -155,6 +308,8 @@ class Parser:
         return Assignment(assignment_op, var, self.expr())
 
     def variable(self):
-        var = Variable(self.current_token)
+        token = self.current_token
+        if token.type == VARIABLE and self.symbols is not None and token.value not in self.symbols:
+            raise self.error(f'{token.value} is not declared', NameError)
         self.eat(VARIABLE)
-        return var
+        return Variable(token)
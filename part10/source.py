@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+from array import array
+from bisect import bisect_left
+
+
+"""
+Source positions
+
+Tokens only record their start offset. Line and column are worked out from
+a newline index, built the first time a position is asked for.
+
+origin is the (line, column) of the first char of text, for text that is
+a piece of a larger source.
+"""
+class SourceMap:
+    def __init__(self, text, origin=(1, 1)):
+        self.text = text
+        self.origin = origin
+        self._newlines = None
+
+    @property
+    def newlines(self):
+        """Offsets of every newline in the text"""
+        if self._newlines is None:
+            self._newlines = newlines = array('I')
+            newline = '\n' if isinstance(self.text, str) else b'\n'
+            pos = self.text.find(newline)
+            while pos != -1:
+                newlines.append(pos)
+                pos = self.text.find(newline, pos + 1)
+        return self._newlines
+
+    def position(self, offset):
+        """1-based (line, column) of offset"""
+        line = bisect_left(self.newlines, offset)
+        first_line, first_column = self.origin
+        if not line:
+            return first_line, first_column + offset
+        return first_line + line, offset - self.newlines[line - 1]
+
+    @staticmethod
+    def advance(origin, text, offset):
+        """(line, column) of text[offset] when text starts at origin"""
+        newline = '\n' if isinstance(text, str) else b'\n'
+        line, column = origin
+        if (newlines := text.count(newline, 0, offset)):
+            return line + newlines, offset - text.rfind(newline, 0, offset)
+        return line, column + offset
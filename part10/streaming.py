@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import codecs
+import mmap
+import os
+
+from lexer import Lexer
+from source import SourceMap
+
+
+"""
+Streaming Lexical Analysis
+"""
+class StreamLexer:
+    """
+    Lexes a file object, text or binary UTF-8, a path (memory-mapped) or an
+    iterable of str chunks, holding only about a chunk of source in memory
+    at a time
+
+    Tokens and comments may straddle chunk boundaries
+    """
+    chunk_size = 1 << 16
+
+    def __init__(self, source, chunk_size=None):
+        self.source = source
+        self.chunk_size = chunk_size or self.chunk_size
+        self.lexer = Lexer('', engine='regex')
+
+    def chunks(self):
+        if isinstance(self.source, (str, bytes, os.PathLike)):
+            return self.mapped_chunks()
+        elif hasattr(self.source, 'read'):
+            return self.read_chunks()
+        return iter(self.source)
+
+    def read_chunks(self):
+        decoder = None
+        # Text streams end with '', binary ones with b''
+        while (chunk := self.source.read(self.chunk_size)):
+            if not isinstance(chunk, str):
+                decoder = decoder or codecs.getincrementaldecoder('utf-8')()
+                chunk = decoder.decode(chunk)
+            yield chunk
+        if decoder is not None:
+            yield decoder.decode(b'', final=True)
+
+    def mapped_chunks(self):
+        with open(self.source, 'rb') as file:
+            if not os.fstat(file.fileno()).st_size:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+                for start in range(0, len(mapped), self.chunk_size):
+                    yield decoder.decode(mapped[start:start + self.chunk_size])
+                yield decoder.decode(b'', final=True)
+
+    @staticmethod
+    def refill(chunks, rest):
+        """
+        rest followed by at least as much again read from chunks, so a token
+        spanning many chunks is copied a bounded number of times.
+        None when chunks is exhausted
+        """
+        pieces, size = [rest], 0
+        for chunk in chunks:
+            pieces.append(chunk)
+            size += len(chunk)
+            if size and size >= len(rest):
+                break
+        return ''.join(pieces) if size else None
+
+    def tokenize(self):
+        pattern, match_token = self.lexer.token_pattern, self.lexer.match_token
+        chunks = self.chunks()
+        buffer, pos, final = '', 0, False
+        # Errors are reported from the buffer, which starts at lexer.origin
+        lexer = self.lexer
+        lexer.text, lexer.origin = buffer, (1, 1)
+        while True:
+            match = pattern.match(buffer, pos)
+            if match.end() == len(buffer) and not final:
+                # The last token may continue in the next chunk, the spaces
+                # and comments before it are done with. Only spaces and
+                # comments left: keep just the '{' of an unterminated one
+                if match.lastgroup:
+                    rest = buffer[match.start(match.lastgroup):]
+                    lexer.origin = SourceMap.advance(lexer.origin, buffer, len(buffer) - len(rest))
+                elif (start := buffer.rfind('{', pos)) != -1 and buffer.find('}', start) == -1:
+                    # The whole comment so far is consumed, a stand-in '{'
+                    # sits one column before where the next chunk starts
+                    rest = '{'
+                    line, column = SourceMap.advance(lexer.origin, buffer, len(buffer))
+                    lexer.origin = (line, column - 1)
+                else:
+                    rest = ''
+                    lexer.origin = SourceMap.advance(lexer.origin, buffer, len(buffer))
+                buffer, pos = self.refill(chunks, rest), 0
+                if buffer is None:
+                    buffer, final = rest, True
+                lexer.text = buffer
+                continue
+
+            if (token := match_token(match)) is self.lexer.end_of_file:
+                return
+            pos = match.end()
+            yield token
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+from constants import INTEGER, REAL
+
+
+"""
+Symbol table
+
+Declared type of each variable of a program, as the INTEGER or REAL
+reserved word. Variables start out as the zero of their type
+"""
+class SymbolTable:
+    types = (INTEGER, REAL)
+    zeros = {INTEGER: 0, REAL: 0.0}
+
+    def __init__(self, symbols=()):
+        self.symbols = {}
+        for name, type in symbols:
+            self.define(name, type)
+
+    def define(self, name, type):
+        if name in self.symbols:
+            raise NameError(f'Duplicate declaration of {name}')
+        self.symbols[name] = type
+
+    def lookup(self, name):
+        return self.symbols.get(name)
+
+    def items(self):
+        return self.symbols.items()
+
+    def storage(self):
+        """Variables of the program, each set to the zero of its type"""
+        return {name: self.zeros[type] for name, type in self.symbols.items()}
+
+    def __contains__(self, name):
+        return name in self.symbols
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __eq__(self, other):
+        return isinstance(other, SymbolTable) and self.symbols == other.symbols
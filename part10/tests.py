@@ -1,9 +1,38 @@
 #!/usr/bin/env python
+import io
+import itertools
+import os
+import pickle
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
 import unittest
 
-from lexer import Lexer
+# The part10 modules import each other from this directory, and the shared
+# lexer core, lexcore.py, from the top of the repository
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ast import BinaryOp, Compound, LazyCompound, NoOp, Number, Program, UnaryOp
+from constants import ASSIGN, BEGIN, COLON, EOF, INTEGER, INTEGER_CONST, MINUS, OPERATOR_CODES, REAL, RPAREN, VARIABLE
+from flat import FlatTree
+from incremental import IncrementalParser
+from lexer import Lexer, Token
+from lookahead import TokenBuffer
+from bytecode import ADD, LOAD, NEGATE, PUSH_BIG_INTEGER, PUSH_INTEGER, PUSH_REAL, STORE_INTEGER, STORE_REAL, VM, Bytecode
+from cache import ParseCache
+from codegen import CodeGenerator
+from compiler import Compiler
+from evaluator import Evaluator
 from interpreter import Interpreter
+from parallel import parallel_tokenize, split_source
 from parser import Parser
+from source import SourceMap
+from streaming import StreamLexer
+from symbols import SymbolTable
+from tokenstream import TokenStream
 
 
 class TestLexer(unittest.TestCase):
@@ -12,19 +41,19 @@ class TestLexer(unittest.TestCase):
         string = "2+3"
         lexer = Lexer(string)
         tokens = [token.value for token in lexer.tokenize()]
-        self.assertEqual(['2', '+', '3'], tokens)
+        self.assertEqual([2, '+', 3], tokens)
 
     def test_surrounding_space(self):
         string = ' 2 + 3 '
         lexer = Lexer(string)
         tokens = [token.value for token in lexer.tokenize()]
-        self.assertEqual(['2', '+', '3'], tokens)
+        self.assertEqual([2, '+', 3], tokens)
 
     def test_all_chars(self):
         string = ' 2.9 + (3 - 4) * 5 / 10 '
         lexer = Lexer(string)
         tokens = [token.value for token in lexer.tokenize()]
-        self.assertEqual(['2.9', '+', '(', '3', '-', '4', ')', '*', '5', '/', '10'], tokens)
+        self.assertEqual([2.9, '+', '(', 3, '-', 4, ')', '*', 5, '/', 10], tokens)
 
     def test_var(self):
         string = 'a'
@@ -36,13 +65,13 @@ class TestLexer(unittest.TestCase):
         string = 'a := 4'
         lexer = Lexer(string)
         tokens = [token.value for token in lexer.tokenize()]
-        self.assertEqual(['a', ':=', '4'], tokens)
+        self.assertEqual(['a', ':=', 4], tokens)
 
     def test_assignment_and_variable_with_semicolon(self):
         string = 'a := 4'
         lexer = Lexer(string)
         tokens = [token.value for token in lexer.tokenize()]
-        self.assertEqual(['a', ':=', '4'], tokens)
+        self.assertEqual(['a', ':=', 4], tokens)
 
     def test_empty_program(self):
         string = 'BEGIN END'
@@ -54,7 +83,7 @@ class TestLexer(unittest.TestCase):
         string = 'BEGIN a := 5; x := 11 END'
         lexer = Lexer(string)
         tokens = [token.value for token in lexer.tokenize()]
-        self.assertEqual(['begin', 'a', ':=', '5', ';', 'x', ':=', '11', 'end'], tokens)
+        self.assertEqual(['begin', 'a', ':=', 5, ';', 'x', ':=', 11, 'end'], tokens)
 
     def test_program_with_comments(self):
         """
@@ -63,7 +92,7 @@ class TestLexer(unittest.TestCase):
         string = 'BEGIN a := 5; {hi ∞} x := 11 END'
         lexer = Lexer(string)
         tokens = [token.value for token in lexer.tokenize()]
-        self.assertEqual(['begin', 'a', ':=', '5', ';', 'x', ':=', '11', 'end'], tokens)
+        self.assertEqual(['begin', 'a', ':=', 5, ';', 'x', ':=', 11, 'end'], tokens)
 
     def test_big_program(self):
         string = """PROGRAM Part10;
@@ -91,10 +120,1133 @@ class TestLexer(unittest.TestCase):
         """
         lexer = Lexer(string)
         tokens = [token.value for token in lexer.tokenize()]
-        expected = ['program', 'part10', ';', 'var', 'number', ':', 'integer', ';', 'a', ',', 'b', ',', 'c', ',', 'x', ':', 'integer', ';', 'y', ':', 'real', ';', 'begin', 'begin', 'number', ':=', '2', ';', 'a', ':=', 'number', ';', 'b', ':=', '10', '*', 'a', '+', '10', '*', 'number', 'div', '4', ';', 'c', ':=', 'a', '-', '-', 'b', 'end', ';', 'x', ':=', '11', ';', 'y', ':=', '20', '/', '7', '+', '3.14', ';', 'end', '.']
+        expected = ['program', 'part10', ';', 'var', 'number', ':', 'integer', ';', 'a', ',', 'b', ',', 'c', ',', 'x', ':', 'integer', ';', 'y', ':', 'real', ';', 'begin', 'begin', 'number', ':=', 2, ';', 'a', ':=', 'number', ';', 'b', ':=', 10, '*', 'a', '+', 10, '*', 'number', 'div', 4, ';', 'c', ':=', 'a', '-', '-', 'b', 'end', ';', 'x', ':=', 11, ';', 'y', ':=', 20, '/', 7, '+', 3.14, ';', 'end', '.']
+
+        self.assertEqual(expected, tokens)
+
+
+    def test_typed_literals(self):
+        tokens = list(Lexer('1 2.5 3. 007').tokenize())
+        self.assertEqual([('INTEGER_CONST', 1), ('REAL_CONST', 2.5), ('REAL_CONST', 3.0), ('INTEGER_CONST', 7)], tokens)
+        self.assertIs(float, type(tokens[2].value))
+
+    def test_malformed_number(self):
+        with self.assertRaises(ValueError):
+            list(Lexer('1.2.3').tokenize())
 
+
+    def test_shared_identifier_tokens(self):
+        for engine in Lexer.engines:
+            with self.subTest(engine=engine):
+                tokens = list(Lexer('Total := total + TOTAL; begin', engine=engine).tokenize())
+                self.assertEqual(('VARIABLE', 'total'), tokens[0])
+                self.assertIs(tokens[0], tokens[2])
+                self.assertIs(tokens[0], tokens[4])
+                self.assertIs(Lexer.reserved_words['begin'], tokens[6])
+
+    def test_identifiers_shared_across_lexers(self):
+        identifiers = {}
+        first = next(Lexer('Total', engine='chars', identifiers=identifiers).tokenize())
+        second = next(Lexer('TOTAL', engine='regex', identifiers=identifiers).tokenize())
+        self.assertIs(first, second)
+        self.assertIs(sys.intern('total'), first.value)
+
+
+class TestRegexLexer(unittest.TestCase):
+    """
+    The regex engine yields the same tokens as the char walker
+    """
+    def assertSameTokens(self, string):
+        expected = list(Lexer(string, engine='chars').tokenize())
+        tokens = list(Lexer(string, engine='regex').tokenize())
         self.assertEqual(expected, tokens)
 
+    def test_all_chars(self):
+        self.assertSameTokens(' 2.9 + (3 - 4) * 5 / 10 div 1. ')
+
+    def test_reserved_words_and_case(self):
+        self.assertSameTokens('PROGRAM p; VAR a, _B2 : INTEGER; c : Real; BeGiN _b2 := A DIV 2 eND.')
+
+    def test_comments(self):
+        self.assertSameTokens('BEGIN a := 5; {hi ∞} x := 11 {} END {unterminated')
+
+    def test_colon_and_assignment(self):
+        self.assertSameTokens('a:=b : c:')
+
+    def test_unexpected_character(self):
+        with self.assertRaises(ValueError):
+            list(Lexer('a := 5 # 3', engine='regex').tokenize())
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            Lexer('a', engine='lex')
+
+
+class TestBytesLexer(unittest.TestCase):
+    """
+    ASCII bytes are lexed in place into the same tokens as the str
+    """
+    program = 'PROGRAM p; VAR a, _B2 : INTEGER; BeGiN {note} _b2 := A DIV 2.5 + (3-1) eND. {open'
+
+    def assertSameTokens(self, text, **kwargs):
+        expected = list(Lexer(self.program).tokenize())
+        lexer = Lexer(text, **kwargs)
+        self.assertEqual(expected, list(lexer.tokenize()))
+        return lexer
+
+    def test_bytes_like(self):
+        source = self.program.encode()
+        for text in (source, bytearray(source), memoryview(source)):
+            self.assertEqual('bytes', self.assertSameTokens(text).engine)
+
+    def test_view_of_larger_buffer(self):
+        source = b'garbage ' + self.program.encode() + b' #'
+        lexer = self.assertSameTokens(memoryview(source)[8:-2])
+        self.assertEqual((1, 10), lexer.position(2))
+
+    def test_get_next_token(self):
+        lexer = Lexer(b'a:=b : c')
+        types = [lexer.get_next_token().type for _ in range(6)]
+        self.assertEqual([VARIABLE, ASSIGN, VARIABLE, COLON, VARIABLE, EOF], types)
+        self.assertEqual(EOF, lexer.get_next_token().type)
+
+    def test_non_ascii_falls_back(self):
+        text = 'BEGIN a := 5 {∞} END.'
+        lexer = Lexer(text.encode(), engine='regex')
+        self.assertEqual('regex', lexer.engine)
+        self.assertEqual(list(Lexer(text).tokenize()), list(lexer.tokenize()))
+
+    def test_unexpected_character(self):
+        with self.assertRaisesRegex(ValueError, 'line 2, column 3'):
+            list(Lexer(b'a := 5;\nb # 3').tokenize())
+
+
+class CountingLexer(Lexer):
+    """Lexer counting its calls of the methods that step through the text"""
+    def __init__(self, *args, **kwargs):
+        self.calls = 0
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def steps(cls, text, engine):
+        lexer = cls(text, engine=engine)
+        list(lexer.tokenize())
+        return lexer.calls
+
+    def counted(name):
+        def method(self, *args):
+            self.calls += 1
+            return getattr(Lexer, name)(self, *args)
+        return method
+
+    advance, jump, peek, match, match_token = map(counted, ('advance', 'jump', 'peek', 'match', 'match_token'))
+    del counted
+
+
+class TestLinearLexing(unittest.TestCase):
+    """
+    Stress tests for megabyte long tokens and comments: the Python-level
+    work per token does not grow with its length, and each token costs a
+    bounded number of copies of its text
+    """
+    size = 2 ** 20
+    programs = {
+        'identifier': lambda size: 'a := ' + 'b' * size,
+        'number': lambda size: 'a := ' + '1' * size + '.5',
+        'comment': lambda size: 'a := {' + 'c' * size + '} 1',
+    }
+
+    def lex(self, text, engine):
+        return list(Lexer(text, engine=engine).tokenize())
+
+    def test_long_tokens(self):
+        for engine in Lexer.engines:
+            for name, program in self.programs.items():
+                with self.subTest(engine=engine, token=name):
+                    tokens = self.lex(program(self.size), engine)
+                    self.assertEqual(3, len(tokens))
+                    self.assertIn(tokens[2].value, (1, 'b' * self.size, float('1' * self.size + '.5')))
+
+    def test_linear_time(self):
+        # Python-level steps do not grow with token length: the text of a
+        # token is consumed by a bounded number of C-level regex matches
+        for engine in Lexer.engines:
+            for name, program in self.programs.items():
+                with self.subTest(engine=engine, token=name):
+                    steps = [CountingLexer.steps(program(size), engine) for size in (self.size // 8, self.size)]
+                    self.assertEqual(steps[0], steps[1])
+                    self.assertLess(steps[1], 50)
+
+    def test_long_integers(self):
+        # Integers past the int/str digit limit are a lexer error at their place
+        text = 'a := 1;\nb := ' + '1' * self.size
+        message = f'Integer literal of {self.size} digits is too long at line 2, column 6'
+        lexers = [lambda engine=engine: Lexer(text, engine=engine).tokenize() for engine in Lexer.engines] + [
+            lambda: Lexer(text.encode()).tokenize(),
+            lambda: TokenStream(text),
+            lambda: StreamLexer([text[:9], text[9:]]).tokenize(),
+            lambda: parallel_tokenize(text, 1),
+        ]
+        for lex in lexers:
+            with self.subTest(lexer=lex):
+                with self.assertRaisesRegex(ValueError, message):
+                    list(lex())
+
+    def test_bounded_allocation(self):
+        for engine in Lexer.engines:
+            for name, program in self.programs.items():
+                with self.subTest(engine=engine, token=name):
+                    text = program(self.size)
+                    tracemalloc.start()
+                    self.lex(text, engine)
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    self.assertLess(peak, 3 * self.size)
+
+
+class TestStreamLexer(unittest.TestCase):
+    text = 'PROGRAM p; BEGIN {a {long comment} number := 2.5 * (bb DIV 3); c:=-a {open'
+
+    def test_chunk_boundaries(self):
+        expected = list(Lexer(self.text).tokenize())
+        for size in range(1, 9):
+            chunks = [self.text[i:i + size] for i in range(0, len(self.text), size)]
+            with self.subTest(size=size):
+                self.assertEqual(expected, list(StreamLexer(chunks).tokenize()))
+
+    def test_file_object(self):
+        expected = list(Lexer(self.text).tokenize())
+        tokens = StreamLexer(io.StringIO(self.text), chunk_size=4).tokenize()
+        self.assertEqual(expected, list(tokens))
+
+    def test_binary_file_object(self):
+        text = self.text.replace('long comment', 'long comment \u00e9\u20ac')
+        expected = list(Lexer(text).tokenize())
+        for size in range(1, 5):
+            with self.subTest(size=size):
+                tokens = StreamLexer(io.BytesIO(text.encode('utf-8')), chunk_size=size).tokenize()
+                self.assertEqual(expected, list(tokens))
+
+    def test_closed_comment_not_carried(self):
+        carried = []
+
+        class RecordingLexer(StreamLexer):
+            @staticmethod
+            def refill(chunks, rest):
+                carried.append(rest)
+                return StreamLexer.refill(chunks, rest)
+
+        comment = '{' + 'x' * 10_000 + '}'
+        tokens = list(RecordingLexer([comment + ' a', 'b := 1 ' + comment, ' ', '{open']).tokenize())
+        self.assertEqual([('VARIABLE', 'ab'), ('ASSIGN', ':='), ('INTEGER_CONST', 1)], tokens)
+        self.assertLess(max(map(len, carried)), 10)
+
+    def test_mapped_path(self):
+        expected = list(Lexer(self.text).tokenize())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'program.pas')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(self.text)
+            self.assertEqual(expected, list(StreamLexer(path, chunk_size=3).tokenize()))
+
+            open(path, 'w').close()
+            self.assertEqual([], list(StreamLexer(path).tokenize()))
+
+    def test_parser_consumes_stream(self):
+        chunks = ['BEGIN a :', '= 5; x := a * (1', '1 - 1) END.']
+        interpreter = Interpreter(Parser(StreamLexer(chunks).tokenize()).parse_program())
+        self.assertEqual({'a': 5, 'x': 50}, interpreter.interpret())
+
+    def test_long_comment_is_not_buffered(self):
+        lexer = StreamLexer(['{'] + ['x' * 1000] * 1000 + ['} a'])
+        tracemalloc.start()
+        tokens = list(lexer.tokenize())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertEqual([('VARIABLE', 'a')], tokens)
+        self.assertLess(peak, 100_000)
+
+
+class TestParallelLexer(unittest.TestCase):
+    text = 'BEGIN {a; comment {with ; x:=1} y := 2.5;z:=(x DIV 2); number := 10 * (a - 1); {open ; comment'
+
+    def test_split_source(self):
+        for pieces in range(1, 12):
+            with self.subTest(pieces=pieces):
+                chunks = split_source(self.text, pieces)
+                self.assertEqual(self.text, ''.join(chunks))
+                expected = list(Lexer(self.text).tokenize())
+                tokens = [token for chunk in chunks for token in Lexer(chunk).tokenize()]
+                self.assertEqual(expected, tokens)
+
+    def test_parallel_tokenize(self):
+        text = ' '.join([self.text.replace('{open ; comment', 'END;')] * 50)
+        expected = list(Lexer(text).tokenize())
+        self.assertEqual(expected, list(parallel_tokenize(text, workers=2, pieces=7)))
+
+
+class TestSourcePositions(unittest.TestCase):
+    text = 'BEGIN\n  a := 5;\n\n  {note}  bb := a * 2\nEND.'
+
+    def test_source_map(self):
+        source_map = SourceMap(self.text)
+        self.assertEqual((1, 1), source_map.position(0))
+        self.assertEqual((1, 6), source_map.position(5))
+        self.assertEqual((2, 1), source_map.position(6))
+        self.assertEqual((4, 11), source_map.position(self.text.index('bb')))
+        self.assertEqual((5, 5), source_map.position(len(self.text)))
+
+    def test_token_positions(self):
+        expected = [(1, 1), (2, 3), (2, 5), (2, 8), (2, 9), (4, 11), (4, 14), (4, 17), (4, 19), (4, 21), (5, 1), (5, 4)]
+        for engine in Lexer.engines:
+            with self.subTest(engine=engine):
+                lexer = Lexer(self.text, engine=engine)
+                tokens = list(lexer.tokenize())
+                self.assertEqual(expected, [lexer.position(index) for index in range(len(tokens))])
+        stream = TokenStream(self.text)
+        self.assertEqual(expected, [stream.position(index) for index in range(len(stream))])
+
+    def test_lexer_error_position(self):
+        for engine in Lexer.engines:
+            with self.subTest(engine=engine):
+                with self.assertRaisesRegex(ValueError, 'Unexpected character # at line 2, column 7'):
+                    list(Lexer('BEGIN\n a := # END.', engine=engine).tokenize())
+
+    def test_helper_lexer_error_positions(self):
+        text = 'BEGIN\n  a := 1;\n  b := ? 2\nEND.'
+        message = 'Unexpected character [?] at line 3, column 8'
+        with self.assertRaisesRegex(ValueError, message):
+            TokenStream(text)
+        stream = TokenStream(text.replace('?', '3'))
+        with self.assertRaisesRegex(ValueError, message):
+            stream.edit(text.index('?'), 1, '?')
+        for size in (1, 3, 7, 100):
+            with self.subTest(size=size), self.assertRaisesRegex(ValueError, message):
+                list(StreamLexer([text[i:i + size] for i in range(0, len(text), size)]).tokenize())
+        with self.assertRaisesRegex(ValueError, message):
+            list(parallel_tokenize(text, workers=2, pieces=4))
+
+    def test_stream_comment_positions(self):
+        # A chunk ending inside an open comment, at a newline and elsewhere
+        self.assertEqual(['line 2, column 4'], self.stream_errors(['a {x\n', 'y} #']))
+        text = 'BEGIN {one\ntwo\n\nthree}\n  a := {x} 1 {\n\n} ?\nEND.'
+        with self.assertRaisesRegex(ValueError, 'line 7, column 3'):
+            list(Lexer(text).tokenize())
+        expected = ['line 7, column 3']
+        self.assertEqual(expected, self.stream_errors(text.splitlines(keepends=True)))
+        for size in range(1, 5):
+            with self.subTest(size=size):
+                self.assertEqual(expected, self.stream_errors([text[i:i + size] for i in range(0, len(text), size)]))
+
+    @staticmethod
+    def stream_errors(chunks):
+        try:
+            list(StreamLexer(chunks).tokenize())
+        except ValueError as error:
+            return re.findall(r'line \d+, column \d+', str(error))
+        return []
+
+    def test_origin(self):
+        source_map = SourceMap('ab\ncd', origin=(3, 5))
+        self.assertEqual([(3, 5), (3, 6), (4, 1)], [source_map.position(offset) for offset in (0, 1, 3)])
+        self.assertEqual((4, 2), SourceMap.advance((3, 5), 'ab\ncd', 4))
+        self.assertEqual((3, 7), SourceMap.advance((3, 5), 'ab\ncd', 2))
+
+    def test_parser_error_position(self):
+        text = 'BEGIN\n  a := 5\n  b := 2\nEND.'
+        lexer = Lexer(text)
+        with self.assertRaisesRegex(TypeError, 'Expected end, got VARIABLE at line 3, column 3'):
+            Parser(lexer.tokenize(), lexer).parse_program()
+        with self.assertRaisesRegex(TypeError, 'at line 3, column 3'):
+            Parser(TokenStream(text)).parse_program()
+        with self.assertRaisesRegex(TypeError, 'Expected DOT, got EOF at line 4, column 4'):
+            Parser(TokenStream('BEGIN\n  a := 5\n\nEND')).parse_program()
+
+
+class TestTokenStream(unittest.TestCase):
+    def test_same_tokens_as_lexer(self):
+        string = 'PROGRAM p; VAR a : INTEGER; BEGIN {hi} A := 2.5 * (b DIV 3); c := -a END.'
+        stream = TokenStream(string)
+        self.assertEqual(list(Lexer(string).tokenize()), list(stream))
+        self.assertEqual(len(stream), len(list(stream)))
+
+    def test_lazy_values(self):
+        stream = TokenStream('Number := 10')
+        self.assertEqual(('VARIABLE', 'number'), stream[0])
+        self.assertEqual(('INTEGER_CONST', 10), stream[2])
+        self.assertIs(Lexer.assignment_token, stream[1])
+        self.assertEqual((0, 10), (stream.starts[0], stream.starts[2]))
+
+    def test_empty(self):
+        self.assertEqual([], list(TokenStream('')))
+
+    def test_parser_consumes_stream(self):
+        text = 'BEGIN a := 5; x := a * (11 - 1) END.'
+        interpreter = Interpreter(Parser(TokenStream(text)).parse_program())
+        self.assertEqual({'a': 5, 'x': 50}, interpreter.interpret())
+
+    def assertSameStream(self, expected, stream):
+        self.assertEqual(expected.text, stream.text)
+        self.assertEqual(expected.kinds, stream.kinds)
+        self.assertEqual(expected.starts, stream.starts)
+        self.assertEqual(expected.ends, stream.ends)
+
+    def test_edit(self):
+        text = 'BEGIN a := 5; {note} bb := a * (11 - 1); c :2 END.'
+        for offset, removed, inserted, relexed in (
+            (text.index('5;') + 1, 0, '5', range(3, 4)),
+            (text.index('note'), 0, 'x', range(5, 5)),
+            (text.index('}'), 1, '', range(5, 5)),
+            (text.index(':2') + 1, 0, '=', range(16, 17)),
+            (text.index('a :='), 0, ' {', range(1, 1)),
+            (0, len(text), '', range(0, 0)),
+        ):
+            with self.subTest(offset=offset, removed=removed, inserted=inserted):
+                stream = TokenStream(text)
+                self.assertEqual(relexed, stream.edit(offset, removed, inserted))
+                self.assertSameStream(TokenStream(text[:offset] + inserted + text[offset + removed:]), stream)
+
+    def test_random_edits(self):
+        alphabet = 'ab1. :=;{}()+-*/\n'
+        generator = random.Random(10)
+        text = 'BEGIN a := 5; {note} bb := a * (11 - 1.5); c := 2 END.'
+        stream = TokenStream(text)
+        for _ in range(500):
+            offset = generator.randrange(len(text) + 1)
+            removed = generator.randrange(min(3, len(text) - offset) + 1)
+            inserted = ''.join(generator.choice(alphabet) for _ in range(generator.randrange(4)))
+            edited = text[:offset] + inserted + text[offset + removed:]
+            try:
+                expected = TokenStream(edited)
+            except ValueError:
+                # A failed edit leaves the stream as it was
+                with self.assertRaises(ValueError):
+                    stream.edit(offset, removed, inserted)
+                self.assertSameStream(TokenStream(text), stream)
+                continue
+            stream.edit(offset, removed, inserted)
+            self.assertSameStream(expected, stream)
+            text = edited
+
+
+def dump(node):
+    """Nested tuples of the tree under node, for comparing trees"""
+    if isinstance(node, BinaryOp):
+        return (node.op, dump(node.left), dump(node.right))
+    elif isinstance(node, UnaryOp):
+        return (node.op, dump(node.operand))
+    elif isinstance(node, Compound):
+        return tuple(dump(child) for child in node.children)
+    return (node.name, getattr(node, 'value', None))
+
+
+class TestCompactAST(unittest.TestCase):
+    def test_slots(self):
+        tree = Parser(Lexer('BEGIN a := -(1 + b) END.').tokenize()).parse_program()
+        assignment = tree.children[0]
+        nodes = [tree, assignment, assignment.left, assignment.right, assignment.right.operand]
+        self.assertEqual(['compound', 'assignment', 'variable', 'unaryop', 'binaryop'], [node.name for node in nodes])
+        for node in nodes:
+            self.assertFalse(hasattr(node, '__dict__'))
+        self.assertEqual(OPERATOR_CODES[MINUS], assignment.right.op)
+
+    def test_empty_statements_elided(self):
+        tree = Parser(Lexer('BEGIN ; a := 1;; BEGIN END; END.').tokenize()).parse_program()
+        self.assertEqual(['assignment', 'compound'], [child.name for child in tree.children])
+        self.assertEqual([], tree.children[1].children)
+        self.assertIs(NoOp(), NoOp())
+
+
+class TestFlatTree(unittest.TestCase):
+    program = """
+    BEGIN
+        BEGIN number := 2; a := number; b := 10 * a + 10 * number div 4; c := a - - b END;
+        x := 11; y := -0.5 * 2.5 + x / 4; BEGIN END; z := y
+    END.
+    """
+
+    def round_trip(self, tree):
+        flat = FlatTree.from_ast(tree)
+        self.assertEqual(dump(tree), dump(flat.to_ast()))
+        loaded = FlatTree.from_buffer(flat.to_bytes())
+        self.assertEqual(dump(tree), dump(loaded.to_ast()))
+        return loaded
+
+    def test_round_trip(self):
+        tree = Parser(Lexer(self.program).tokenize()).parse_program()
+        flat = self.round_trip(tree)
+        self.assertEqual(Interpreter(tree).interpret(), flat.interpret())
+
+    def test_expression(self):
+        tree = Parser(Lexer('-(3 + 4) * 2.5 div 2').tokenize()).parse()
+        self.assertEqual(Interpreter(tree).interpret(), self.round_trip(tree).interpret())
+
+    def test_big_integers(self):
+        text = f'BEGIN a := {2 ** 63}; b := -{10 ** 30} + a; c := {2 ** 63 - 1}; d := {2 ** 63} END.'
+        tree = Parser(Lexer(text)).parse_program()
+        flat = self.round_trip(tree)
+        self.assertEqual({'a': 2 ** 63, 'b': 2 ** 63 - 10 ** 30, 'c': 2 ** 63 - 1, 'd': 2 ** 63}, flat.interpret())
+        self.assertEqual([2 ** 63 - 1], list(flat.integers))
+
+    def test_shared_pools(self):
+        flat = FlatTree.from_ast(Parser(Lexer('BEGIN a := 1; a := a + 1; b := 1.0 END.').tokenize()).parse_program())
+        self.assertEqual([1], list(flat.integers))
+        self.assertEqual([1.0], list(flat.reals))
+        self.assertEqual(['a', 'b'], [flat.name(index) for index in range(2)])
+
+    def test_deep_tree(self):
+        tree = Number(Token(INTEGER_CONST, 1))
+        for _ in range(100_000):
+            tree = UnaryOp(Token(MINUS, '-'), tree)
+        flat = FlatTree.from_buffer(FlatTree.from_ast(tree).to_bytes())
+        self.assertEqual(1, flat.interpret())
+        node, depth = flat.to_ast(), 0
+        while isinstance(node, UnaryOp):
+            node, depth = node.operand, depth + 1
+        self.assertEqual((100_000, 1), (depth, node.value))
+
+    def test_mapped_file(self):
+        tree = Parser(Lexer(self.program).tokenize()).parse_program()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'program.flat')
+            FlatTree.from_ast(tree).write(path)
+            flat = FlatTree.read(path)
+            self.assertIsInstance(flat.kinds, memoryview)
+            self.assertEqual(Interpreter(tree).interpret(), flat.interpret())
+            del flat
+
+    def test_bad_buffers(self):
+        data = FlatTree.from_ast(Parser(Lexer(self.program).tokenize()).parse_program()).to_bytes()
+        for bad in (b'', b'NOTFLAT!' + data[8:], data[:8] + bytes([FlatTree.version + 1]) + data[9:], data[:-1]):
+            with self.assertRaises(ValueError):
+                FlatTree.from_buffer(bad)
+
+
+class TestParseCache(unittest.TestCase):
+    program = 'BEGIN a := 2; b := a * (3 + a) div 4 END.'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def files(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_memory_hits(self):
+        cache = ParseCache()
+        tree = cache.parse_program(self.program)
+        self.assertIs(tree, cache.parse_program(self.program))
+        self.assertEqual({'hits': 1, 'disk_hits': 0, 'misses': 1}, cache.stats)
+        self.assertEqual({'a': 2, 'b': 2}, Interpreter(tree).interpret())
+
+    def test_lru_eviction(self):
+        cache = ParseCache(size=2)
+        programs = [f'BEGIN a := {i} END.' for i in range(3)]
+        for text in programs + programs[2:] + programs[:1]:
+            cache.parse_program(text)
+        self.assertEqual({'hits': 1, 'disk_hits': 0, 'misses': 4}, cache.stats)
+
+    def test_disk_hits(self):
+        tree = ParseCache(self.directory).parse_program(self.program)
+        cache = ParseCache(self.directory)
+        self.assertEqual(dump(tree), dump(cache.parse_program(self.program)))
+        self.assertEqual({'hits': 0, 'disk_hits': 1, 'misses': 0}, cache.stats)
+        # Only the finished file is left behind
+        self.assertEqual([cache.key(self.program) + '.flat'], self.files())
+
+    def test_corrupt_file(self):
+        cache = ParseCache(self.directory)
+        with open(cache.path(cache.key(self.program)), 'wb') as file:
+            file.write(b'PASFLAT')
+        cache.parse_program(self.program)
+        self.assertEqual({'hits': 0, 'disk_hits': 0, 'misses': 1}, cache.stats)
+        # The broken file was replaced
+        cache = ParseCache(self.directory)
+        cache.parse_program(self.program)
+        self.assertEqual({'hits': 0, 'disk_hits': 1, 'misses': 0}, cache.stats)
+
+    def test_versioned_key(self):
+        cache = ParseCache()
+        key = cache.key(self.program)
+        cache.tag = 'other-version'
+        self.assertNotEqual(key, cache.key(self.program))
+
+    def test_disk_eviction(self):
+        first, second = self.program, self.program.replace('2', '3')
+        cache = ParseCache(self.directory)
+        cache.parse_program(first)
+        # Room for one file only
+        cache.disk_size = os.path.getsize(cache.path(cache.key(first)))
+        time.sleep(0.01)
+        cache.parse_program(second)
+        self.assertEqual([cache.key(second) + '.flat'], self.files())
+
+    def test_errors_are_not_cached(self):
+        cache = ParseCache(self.directory)
+        for _ in range(2):
+            with self.assertRaises(TypeError):
+                cache.parse_program('BEGIN a := END.')
+        self.assertEqual({'hits': 0, 'disk_hits': 0, 'misses': 2}, cache.stats)
+        self.assertEqual([], self.files())
+
+    def test_big_integers(self):
+        program = 'BEGIN a := 100000000000000000000000 END.'
+        tree = ParseCache(self.directory).parse_program(program)
+        self.assertEqual({'a': 10 ** 23}, Interpreter(tree).interpret())
+        cache = ParseCache(self.directory)
+        self.assertEqual(dump(tree), dump(cache.parse_program(program)))
+        self.assertEqual({'hits': 0, 'disk_hits': 1, 'misses': 0}, cache.stats)
+
+    def test_missing_directory(self):
+        cache = ParseCache(self.directory)
+        os.rmdir(self.directory)
+        tree = cache.parse_program(self.program)
+        self.assertEqual({'a': 2, 'b': 2}, Interpreter(tree).interpret())
+        self.assertEqual({'hits': 0, 'disk_hits': 0, 'misses': 1}, cache.stats)
+
+    def test_eviction_without_directory(self):
+        cache = ParseCache(self.directory)
+        os.rmdir(self.directory)
+        cache.evict()
+
+    def test_read_only_directory(self):
+        # Files can be read but not touched
+        def utime(path, *args, **kwargs):
+            raise PermissionError(path)
+
+        ParseCache(self.directory).parse_program(self.program)
+        self.addCleanup(setattr, os, 'utime', os.utime)
+        os.utime = utime
+        for _ in range(2):
+            cache = ParseCache(self.directory)
+            tree = cache.parse_program(self.program)
+            self.assertEqual({'hits': 0, 'disk_hits': 1, 'misses': 0}, cache.stats)
+        self.assertEqual({'a': 2, 'b': 2}, Interpreter(tree).interpret())
+        self.assertEqual([cache.key(self.program) + '.flat'], self.files())
+
+    def test_unencodable_tree(self):
+        def from_ast(tree):
+            raise OverflowError('too big')
+
+        self.addCleanup(setattr, FlatTree, 'from_ast', FlatTree.from_ast)
+        FlatTree.from_ast = from_ast
+        cache = ParseCache(self.directory)
+        tree = cache.parse_program(self.program)
+        # The parse still succeeds, the tree is only kept in memory
+        self.assertEqual({'a': 2, 'b': 2}, Interpreter(tree).interpret())
+        self.assertIs(tree, cache.parse_program(self.program))
+        self.assertEqual([], self.files())
+
+
+class TestLazyParser(unittest.TestCase):
+    program = """
+    BEGIN
+        BEGIN number := 2; a := number; BEGIN b := 10 * a + 10 * number div 4 END; c := a - - b END;
+        x := 11; BEGIN END; BEGIN BEGIN y := x END END
+    END.
+    """
+
+    def parse(self, text, **kwargs):
+        return Parser(TokenStream(text), **kwargs).parse_program()
+
+    def test_same_tree(self):
+        tree = self.parse(self.program, lazy=True)
+        self.assertEqual(dump(self.parse(self.program)), dump(tree))
+        self.assertEqual(Interpreter(self.parse(self.program)).interpret(), Interpreter(tree).interpret())
+
+    def test_blocks_parsed_when_entered(self):
+        tree = self.parse(self.program, lazy=True)
+        first, last = tree.children[0], tree.children[-1]
+        self.assertIsInstance(first, LazyCompound)
+        self.assertIsNone(first.parsed)
+        self.assertEqual(['assignment', 'assignment', 'lazycompound', 'assignment'], [child.name for child in first.children])
+        self.assertIsNone(first.children[2].parsed)
+        self.assertIsNone(last.parsed)
+
+    def test_errors_when_entered(self):
+        tree = self.parse('BEGIN a := 1; BEGIN b := * END END.', lazy=True)
+        with self.assertRaisesRegex(TypeError, 'line 1, column 26'):
+            Interpreter(tree).interpret()
+
+    def test_unmatched_begin(self):
+        with self.assertRaises(TypeError):
+            self.parse('BEGIN a := 1; BEGIN b := 2 END.', lazy=True)
+
+    def test_needs_token_stream(self):
+        with self.assertRaises(ValueError):
+            Parser(Lexer(self.program).tokenize(), lazy=True)
+
+    def test_pratt_engine(self):
+        tree = self.parse(self.program, lazy=True, engine='pratt')
+        self.assertEqual(dump(self.parse(self.program)), dump(tree))
+
+
+class TestTokenBuffer(unittest.TestCase):
+    program = TestLazyParser.program
+
+    def test_same_tree(self):
+        expected = dump(Parser(Lexer(self.program).tokenize()).parse_program())
+        for lexer_engine, engine, lookahead in itertools.product(Lexer.engines, Parser.engines, (None, 4)):
+            with self.subTest(lexer_engine=lexer_engine, engine=engine, lookahead=lookahead):
+                tree = Parser(Lexer(self.program, engine=lexer_engine), engine=engine, lookahead=lookahead).parse_program()
+                self.assertEqual(expected, dump(tree))
+        self.assertEqual(expected, dump(Parser(Lexer(self.program.encode()), lookahead=4).parse_program()))
+
+    def test_peek(self):
+        for engine in Lexer.engines:
+            with self.subTest(engine=engine):
+                buffer = TokenBuffer(Lexer('BEGIN a := 1 END.', engine=engine))
+                self.assertEqual(Token(ASSIGN, ':='), buffer.peek(2))
+                self.assertEqual(Token(VARIABLE, 'a'), buffer.peek(1))
+                tokens = [buffer.pop() for _ in range(7)]
+                self.assertEqual(list(Lexer('BEGIN a := 1 END.').tokenize()) + [Lexer.end_of_file], tokens)
+                self.assertIs(Lexer.end_of_file, buffer.peek(3))
+                self.assertIs(Lexer.end_of_file, buffer.pop())
+
+    def test_parser_peek(self):
+        parser = Parser(Lexer('BEGIN a := 1; b := 2 END.'), lookahead=2)
+        parser.eat(BEGIN)
+        self.assertEqual([Token(ASSIGN, ':='), Token(INTEGER_CONST, 1)], [parser.peek(1), parser.peek(2)])
+        with self.assertRaises(IndexError):
+            parser.peek(3)
+        self.assertEqual(Token(VARIABLE, 'a'), parser.current_token)
+        self.assertEqual({'a': 1, 'b': 2}, Interpreter(Compound(parser.statement_list())).interpret())
+        with self.assertRaises(ValueError):
+            Parser(Lexer('BEGIN END.').tokenize()).peek()
+        # Without a lookahead a Lexer is read through tokenize()
+        with self.assertRaises(ValueError):
+            Parser(Lexer('BEGIN END.')).peek()
+
+    def test_lookahead_size(self):
+        for size in (0, 3, 6):
+            with self.assertRaises(ValueError):
+                TokenBuffer(Lexer(''), size)
+
+    def test_error_positions(self):
+        for engine in Lexer.engines:
+            with self.subTest(engine=engine):
+                parser = Parser(Lexer('BEGIN\n  a := * 2 END.', engine=engine), lookahead=4)
+                parser.peek(4)
+                with self.assertRaisesRegex(TypeError, 'line 2, column 8'):
+                    parser.parse_program()
+
+
+class TestIncrementalParser(unittest.TestCase):
+    program = """BEGIN
+    BEGIN number := 2; a := number; BEGIN b := 10 * a + 10 * number div 4 END; c := a - - b END;
+    x := 11;
+    BEGIN y := x END
+END."""
+
+    def assertReparsed(self, parser):
+        self.assertEqual(dump(Parser(TokenStream(parser.text)).parse_program()), dump(parser.tree))
+
+    def test_innermost_block_reparsed(self):
+        parser = IncrementalParser(self.program)
+        tree, first, last = parser.tree, parser.tree.children[0], parser.tree.children[-1]
+        offset = self.program.index('10 * a') + 5
+        node = parser.edit(offset, 1, 'number * 5')
+        self.assertIs(first.children[2], node)
+        self.assertIs(tree, parser.tree)
+        self.assertIs(last, parser.tree.children[-1])
+        self.assertReparsed(parser)
+        self.assertEqual(107, Interpreter(parser.tree).interpret()['c'])
+
+    def test_statements_added(self):
+        parser = IncrementalParser(self.program)
+        offset = self.program.index('y := x')
+        self.assertIs(parser.tree.children[-1], parser.edit(offset, 0, 'z := 1; BEGIN w := 2 END; '))
+        parser.edit(parser.text.index('w := 2') + 5, 1, '3')
+        self.assertReparsed(parser)
+        self.assertEqual({'z': 1, 'w': 3, 'y': 11}, {key: value for key, value in Interpreter(parser.tree).interpret().items() if key in 'zwy'})
+
+    def test_structure_changes(self):
+        parser = IncrementalParser(self.program)
+        # An END inside a block, and a comment swallowing the rest of one
+        parser.edit(self.program.index('c := a'), 0, 'END; BEGIN ')
+        self.assertReparsed(parser)
+        with self.assertRaises(TypeError):
+            parser.edit(parser.text.index('x := 11'), 0, '{')
+        parser.edit(parser.text.index('{'), 1, '')
+        self.assertReparsed(parser)
+
+    def test_errors(self):
+        parser = IncrementalParser(self.program)
+        offset = self.program.index('y := x') + 5
+        with self.assertRaises(TypeError):
+            parser.edit(offset, 1, '*')
+        parser.edit(offset, 1, 'x + 1')
+        self.assertReparsed(parser)
+
+    def test_name_errors(self):
+        text = f'PROGRAM Edits; VAR number, a, b, c, x, y : INTEGER;\n{self.program}'
+        parser = IncrementalParser(text)
+        # A failed edit in one block, fixed, then an edit in a block after it
+        with self.assertRaises(NameError):
+            parser.edit(text.index('c := a'), 0, 'q := 1; ')
+        parser.edit(parser.text.index('q := 1'), 1, 'a')
+        parser.edit(parser.text.index('y := x') + 5, 1, 'x + 1')
+        self.assertReparsed(parser)
+        self.assertEqual(12, Interpreter(parser.tree).interpret()['y'])
+
+    def test_random_edits(self):
+        generator = random.Random(7)
+        parser = IncrementalParser(self.program)
+        for _ in range(200):
+            text = parser.text
+            if generator.random() < 0.5:
+                offset = generator.choice([match.end() for match in re.finditer('BEGIN |; ', text)])
+                parser.edit(offset, 0, generator.choice(['q := 1; ', 'BEGIN r := q END; ', 'BEGIN END; ']))
+            else:
+                match = generator.choice(list(re.finditer(r'\d+', text)))
+                parser.edit(match.start(), len(match.group()), str(generator.randrange(100)))
+            self.assertReparsed(parser)
+
+
+class TestPrattParser(unittest.TestCase):
+    """
+    The Pratt engine builds the same trees as recursive descent
+    """
+    expressions = [
+        '5 - 2 * 6 + 8',
+        '6 - 8*3 + 19/5 + 85 div 17 - 3*4',
+        '1 - 2 - 3 / 4 / 5 div 6',
+        '-(3 + 4) * - - +2 - -x',
+        '((((a)))) * (b + c) div (2.5 - - d)',
+        '- 2 * 3 + 4 * -(5 - 6 * 7) / 8',
+    ]
+
+    def parse(self, text, engine):
+        return Parser(Lexer(text).tokenize(), engine=engine).parse()
+
+    def test_same_trees(self):
+        for text in self.expressions:
+            with self.subTest(text=text):
+                self.assertEqual(dump(self.parse(text, 'descent')), dump(self.parse(text, 'pratt')))
+
+    def test_random_expressions(self):
+        generator = random.Random(13)
+
+        def expression(depth):
+            if depth == 0 or generator.random() < 0.3:
+                return generator.choice(['1', '2.5', 'x', '(y)'])
+            elif generator.random() < 0.2:
+                return generator.choice('+-') + expression(depth - 1)
+            elif generator.random() < 0.2:
+                return f'({expression(depth - 1)})'
+            operator = generator.choice(['+', '-', '*', '/', 'div'])
+            return f'{expression(depth - 1)} {operator} {expression(depth - 1)}'
+
+        for _ in range(200):
+            text = expression(6)
+            self.assertEqual(dump(self.parse(text, 'descent')), dump(self.parse(text, 'pratt')), text)
+
+    def test_program(self):
+        text = 'BEGIN BEGIN number := 2; a := number; b := 10 * a + 10 * number div 4; c := a - - b END; x := 11 END.'
+        trees = [Parser(Lexer(text).tokenize(), engine=engine).parse_program() for engine in Parser.engines]
+        self.assertEqual(dump(trees[0]), dump(trees[1]))
+        self.assertEqual({'number': 2, 'a': 2, 'b': 25, 'c': 27, 'x': 11}, Interpreter(trees[1]).interpret())
+
+    def test_same_errors(self):
+        for text in ('1 + * 2', '(1 + 2', '1 + ;'):
+            errors = []
+            for engine in Parser.engines:
+                lexer = Lexer(text)
+                with self.assertRaises(TypeError) as context:
+                    Parser(lexer.tokenize(), lexer, engine=engine).parse()
+                errors.append(str(context.exception))
+            self.assertEqual(errors[0], errors[1])
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            Parser([], engine='lalr')
+
+
+class TestDeclarations(unittest.TestCase):
+    program = """
+    PROGRAM Part10;
+    VAR
+        number, a : INTEGER;
+        x, y : REAL;
+    BEGIN
+        number := 2; a := number DIV 2;
+        BEGIN x := a + 1 END;
+        y := x / 4
+    END.
+    """
+
+    def parse(self, text, **kwargs):
+        return Parser(TokenStream(text), **kwargs).parse_program()
+
+    def test_symbol_table(self):
+        tree = self.parse(self.program)
+        self.assertIsInstance(tree, Program)
+        self.assertEqual('part10', tree.identifier)
+        self.assertEqual({'number': INTEGER, 'a': INTEGER, 'x': REAL, 'y': REAL}, dict(tree.symbols.items()))
+        self.assertEqual(SymbolTable([('number', INTEGER), ('a', INTEGER), ('x', REAL), ('y', REAL)]), tree.symbols)
+
+    def test_typed_storage(self):
+        table = Interpreter(self.parse(self.program)).interpret()
+        self.assertEqual({'number': 2, 'a': 1, 'x': 2.0, 'y': 0.5}, table)
+        self.assertIsInstance(table['x'], float)
+        table = Interpreter(self.parse('PROGRAM p; VAR a : INTEGER; b : REAL; BEGIN END.')).interpret()
+        self.assertEqual({'a': 0, 'b': 0.0}, table)
+        self.assertIsInstance(table['b'], float)
+
+    def test_real_to_integer(self):
+        tree = self.parse('PROGRAM p; VAR a : INTEGER; BEGIN a := 1 / 2 END.')
+        with self.assertRaisesRegex(TypeError, 'INTEGER variable a'):
+            Interpreter(tree).interpret()
+
+    def test_undeclared(self):
+        with self.assertRaisesRegex(NameError, 'b is not declared at line 1, column 40'):
+            self.parse('PROGRAM p; VAR a : INTEGER; BEGIN a := b END.')
+        with self.assertRaisesRegex(NameError, 'b is not declared'):
+            self.parse('PROGRAM p; VAR a : INTEGER; BEGIN b := a END.', engine='pratt')
+
+    def test_duplicate(self):
+        with self.assertRaisesRegex(NameError, 'Duplicate declaration of a at line 1'):
+            self.parse('PROGRAM p; VAR a : INTEGER; b, a : REAL; BEGIN END.')
+
+    def test_bad_declarations(self):
+        for text in (
+            'PROGRAM p; VAR a : BEGIN; BEGIN END.',
+            'PROGRAM p; VAR a INTEGER; BEGIN END.',
+            'PROGRAM p; VAR BEGIN END.',
+            'PROGRAM p BEGIN END.',
+        ):
+            with self.subTest(text=text), self.assertRaises(TypeError):
+                self.parse(text)
+
+    def test_bare_compound_statement(self):
+        tree = self.parse('BEGIN a := 1 END.')
+        self.assertIsInstance(tree, Compound)
+        self.assertEqual({'a': 1}, Interpreter(tree).interpret())
+
+    def test_flat_round_trip(self):
+        tree = self.parse(self.program)
+        flat = FlatTree.from_buffer(FlatTree.from_ast(tree).to_bytes())
+        loaded = flat.to_ast()
+        self.assertEqual(('part10', tree.symbols), (loaded.identifier, loaded.symbols))
+        self.assertEqual(dump(tree.block), dump(loaded.block))
+        self.assertEqual(Interpreter(tree).interpret(), flat.interpret())
+        with self.assertRaises(TypeError):
+            FlatTree.from_ast(self.parse('PROGRAM p; VAR a : INTEGER; BEGIN a := 0.5 END.')).interpret()
+
+    def test_lazy(self):
+        with self.assertRaisesRegex(NameError, 'z is not declared'):
+            Interpreter(self.parse(self.program.replace('x := a', 'x := z'), lazy=True)).interpret()
+        tree = self.parse(self.program, lazy=True)
+        self.assertEqual(Interpreter(self.parse(self.program)).interpret(), Interpreter(tree).interpret())
+
+    def test_incremental(self):
+        parser = IncrementalParser(self.program)
+        block = parser.tree.block.children[2]
+        offset = self.program.index('x := a') + 5
+        self.assertIs(block, parser.edit(offset, 1, 'number'))
+        self.assertEqual(3.0, Interpreter(parser.tree).interpret()['x'])
+        with self.assertRaises(NameError):
+            parser.edit(offset, 6, 'z')
+
+
+class BackendTests:
+    """
+    Checks shared by the backends that run a tree as Interpreter.interpret
+    does. compile(tree) gives a callable running the tree
+    """
+    expressions = ('-(3 + 4) * 2.5 div 2', '7 / 2', '- - +1', '(1 + 2) * (3 - 4) / 5 div 6', '1' + '0' * 400 + '.0')
+
+    def compile(self, tree):
+        raise NotImplementedError
+
+    def assertSameResults(self, tree):
+        self.assertEqual(Interpreter(tree).interpret(), self.compile(tree)())
+
+    def test_programs(self):
+        for text in (TestFlatTree.program, TestLazyParser.program, TestDeclarations.program):
+            with self.subTest(text=text):
+                self.assertSameResults(Parser(TokenStream(text)).parse_program())
+                self.assertSameResults(Parser(TokenStream(text), lazy=True).parse_program())
+
+    def test_expressions(self):
+        for text in self.expressions:
+            with self.subTest(text=text):
+                self.assertSameResults(Parser(Lexer(text).tokenize()).parse())
+
+    def test_runs_again(self):
+        run = self.compile(Parser(Lexer('BEGIN a := 1; b := a + 1 END.')).parse_program())
+        self.assertEqual({'a': 1, 'b': 2}, run())
+        self.assertEqual({'a': 1, 'b': 2}, run())
+
+    def test_empty_statements(self):
+        # The parser drops empty statements, trees built otherwise keep them
+        assignment = Parser(Lexer('BEGIN a := 1 END.')).parse_program().children[0]
+        tree = Compound([NoOp(), assignment, Compound([NoOp()]), NoOp()])
+        self.assertSameResults(tree)
+        self.assertSameResults(FlatTree.from_buffer(FlatTree.from_ast(tree).to_bytes()).to_ast())
+
+    def test_errors(self):
+        run = self.compile(Parser(Lexer('BEGIN a := 1; a := b; b := 2 END.')).parse_program())
+        with self.assertRaisesRegex(NameError, 'b is not defined'):
+            run()
+        run = self.compile(Parser(Lexer('PROGRAM p; VAR a : INTEGER; BEGIN a := 1 / 2 END.')).parse_program())
+        with self.assertRaisesRegex(TypeError, 'INTEGER variable a'):
+            run()
+
+
+class TestCompiler(BackendTests, unittest.TestCase):
+    def compile(self, tree):
+        return Compiler(tree).compile()
+
+    def test_new_table_per_run(self):
+        run = self.compile(Parser(Lexer('BEGIN a := 1 END.')).parse_program())
+        self.assertIsNot(run(), run())
+
+    def test_lazy_errors_when_run(self):
+        run = Compiler(Parser(TokenStream('BEGIN a := 1; BEGIN b := * END END.'), lazy=True).parse_program()).compile()
+        with self.assertRaisesRegex(TypeError, 'line 1, column 26'):
+            run()
+
+
+class TestCodeGenerator(BackendTests, unittest.TestCase):
+    def compile(self, tree):
+        return CodeGenerator(tree).compile()
+
+    def test_source(self):
+        generator = CodeGenerator(Parser(Lexer('PROGRAM p; VAR a : INTEGER; b : REAL; BEGIN a := 7 div 2; b := a / 2 END.')).parse_program())
+        self.assertIn('v1 = float((v0 / 2))', generator.source)
+        self.assertIn('(7 // 2)', generator.source)
+        self.assertEqual({'a': 3, 'b': 1.5}, generator.compile()())
+
+    def test_python_names(self):
+        tree = Parser(Lexer('BEGIN lambda := 1; def := lambda + 1; print := def; t_0 := print; undefined := 2 END.')).parse_program()
+        self.assertSameResults(tree)
+
+    def test_injected_names(self):
+        payload = "a[__import__('os').system('echo INJECTED')]"
+        for text in ('BEGIN a := 1 END.', 'BEGIN b := 1; c := a END.', 'BEGIN a := 1; c := a END.'):
+            with self.subTest(text=text):
+                tree = Parser(Lexer(text)).parse_program()
+                for node in (tree.children[-1].left, tree.children[-1].right):
+                    if node.value == 'a':
+                        node.value = payload
+                # As a tree read back from a flat file would have it
+                tree = FlatTree.from_buffer(FlatTree.from_ast(tree).to_bytes()).to_ast()
+                with self.assertRaisesRegex(ValueError, 'Bad variable name'):
+                    CodeGenerator(tree).source
+
+    def test_deep_expressions(self):
+        # Deeper than the Interpreter and the Python parser can nest
+        for text, y in (
+            ('BEGIN x := 1; y := ' + ' + '.join(['x'] * 10_000) + ' END.', 10_000),
+            ('BEGIN x := 1; y := ' + '(' * 200 + '-x' + ') + 1' * 200 + ' END.', 199),
+        ):
+            tree = Parser(Lexer(text), engine='pratt').parse_program()
+            self.assertEqual({'x': 1, 'y': y}, CodeGenerator(tree).compile()())
+
+    def test_code_cached(self):
+        text = 'BEGIN a := 1; b := a * 3 END.'
+        cache = ParseCache()
+        first = CodeGenerator(cache.parse_program(text))
+        second = CodeGenerator(cache.parse_program(text))
+        self.assertIs(first.code(), second.code())
+        # A cached program is not generated again
+        self.assertIsNone(second._source)
+        # Separately parsed trees of one source share the code through a key
+        keyed = [CodeGenerator(Parser(Lexer(text)).parse_program(), cache.key(text)) for _ in range(2)]
+        self.assertIs(keyed[0].code(), keyed[1].code())
+        self.assertIsNone(keyed[1]._source)
+        self.assertIsNot(first.code(), keyed[0].code())
+        self.assertEqual(first.compile()(), keyed[1].compile()())
+
+
+class TestBytecode(BackendTests, unittest.TestCase):
+    def compile(self, tree):
+        return VM(Bytecode.from_ast(tree)).run
+
+    def assertSameResults(self, tree):
+        super().assertSameResults(tree)
+        # And after a round trip through the binary format
+        loaded = Bytecode.from_buffer(Bytecode.from_ast(tree).to_bytes())
+        self.assertEqual(Interpreter(tree).interpret(), VM(loaded).run())
+
+    def test_instructions(self):
+        bytecode = Bytecode.from_ast(Parser(Lexer('PROGRAM p; VAR x : REAL; a : INTEGER; BEGIN a := 1; x := -a + 2.5 END.')).parse_program())
+        self.assertEqual(
+            [PUSH_INTEGER, 0, STORE_INTEGER, 1, LOAD, 1, NEGATE, 0, PUSH_REAL, 0, ADD, 0, STORE_REAL, 0],
+            bytecode.code.tolist(),
+        )
+        self.assertEqual(['x', 'a'], bytecode.names())
+        self.assertEqual(7, len(bytecode))
+
+    def test_big_integers(self):
+        text = 'BEGIN a := 100000000000000000000000; b := -9223372036854775808 + a; c := 9223372036854775807 END.'
+        tree = Parser(Lexer(text)).parse_program()
+        self.assertSameResults(tree)
+        bytecode = Bytecode.from_ast(tree)
+        self.assertEqual([PUSH_BIG_INTEGER, 0], bytecode.code.tolist()[:2])
+        self.assertEqual([10 ** 23, 1 << 63], Bytecode.from_buffer(bytecode.to_bytes()).big_integers())
+
+    def test_deep_expression(self):
+        tree = Parser(Lexer('BEGIN x := 1; y := ' + ' + '.join(['x'] * 100_000) + ' END.'), engine='pratt').parse_program()
+        self.assertEqual({'x': 1, 'y': 100_000}, VM(Bytecode.from_ast(tree)).run())
+
+    def test_pickle(self):
+        bytecode = Bytecode.from_ast(Parser(TokenStream(TestFlatTree.program)).parse_program())
+        for loaded in (pickle.loads(pickle.dumps(bytecode)), pickle.loads(pickle.dumps(Bytecode.from_buffer(bytecode.to_bytes())))):
+            self.assertEqual(VM(bytecode).run(), VM(loaded).run())
+
+    def test_bad_buffers(self):
+        data = Bytecode.from_ast(Parser(Lexer('BEGIN a := 1 END.')).parse_program()).to_bytes()
+        for bad in (b'', b'NOTCODE!' + data[8:], data[:8] + bytes([Bytecode.version + 1]) + data[9:], data[:-1]):
+            with self.assertRaises(ValueError):
+                Bytecode.from_buffer(bad)
+
+
+class TestEvaluator(unittest.TestCase):
+    """
+    Streaming evaluation gives the same values as parsing and interpreting
+    """
+    def evaluate(self, text, **variables):
+        return Evaluator(Lexer(text).tokenize(), variables).evaluate()
+
+    def test_same_values(self):
+        for text in TestPrattParser.expressions + ['7', '(1 + 2) * 3 - 4 div (5 - 3)', '2 * - 3 * 4']:
+            with self.subTest(text=text):
+                interpreter = Interpreter(Parser(Lexer(text).tokenize()).parse())
+                interpreter.table.update(x=3, a=1, b=2, c=4, d=0.5)
+                self.assertEqual(interpreter.interpret(), self.evaluate(text, x=3, a=1, b=2, c=4, d=0.5))
+
+    def test_stops_at_end_of_expression(self):
+        evaluator = Evaluator(Lexer('(1 + 2)) ; x').tokenize())
+        self.assertEqual(3, evaluator.evaluate())
+        self.assertEqual(RPAREN, evaluator.current_token.type)
+
+    def test_errors(self):
+        with self.assertRaises(NameError):
+            self.evaluate('1 + y')
+        for text in ('1 + * 2', '(1 + 2', ''):
+            with self.subTest(text=text), self.assertRaises(TypeError):
+                self.evaluate(text)
+
+    def test_deep_parentheses(self):
+        depth = 100_000
+        chunks = ['('] * depth + ['-x'] + [') + 1'] * depth
+        self.assertEqual(depth - 1, Evaluator(StreamLexer(chunks).tokenize(), {'x': 1}).evaluate())
+
+    def test_deep_prefix_operators(self):
+        self.assertEqual(5, self.evaluate('-' * 100_001 + '(-5)'))
+
+    def test_bounded_memory(self):
+        chunks = (f'{i} * x - {i} div 3 + ' for i in range(20_000))
+        evaluator = Evaluator(StreamLexer(itertools.chain(chunks, ['0'])).tokenize(), {'x': 2})
+        tracemalloc.start()
+        value = evaluator.evaluate()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertEqual(sum(i * 2 - i // 3 for i in range(20_000)), value)
+        self.assertLess(peak, 50_000)
 
 
 class TestInterpreter(unittest.TestCase):
@@ -215,6 +1367,14 @@ class TestInterpreter(unittest.TestCase):
         interpreter = Interpreter(parser.parse_program())
         self.assertEqual({'a': 5, 'x': 11}, interpreter.interpret())
 
+    def test_million_statements(self):
+        """
+        Statement lists are parsed in a loop, not a recursion per statement
+        """
+        text = 'BEGIN ' + '; '.join(['BEGIN END'] * 1_000_000) + ' END.'
+        tree = Parser(Lexer(text, engine='regex').tokenize()).parse_program()
+        self.assertEqual(1_000_000, len(tree.children))
+
     def test_program_with_var_manipulation(self):
         text = """
         BEGIN
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+from array import array
+from bisect import bisect_left
+import re
+
+from constants import (
+    INTEGER_CONST, REAL_CONST, VARIABLE, BEGIN, END,
+)
+from lexer import Lexer, Token
+from source import SourceMap
+
+
+"""
+Compact token stream
+
+Stores each token as a small int kind plus start/end offsets into the source
+instead of a Token per token. Values are sliced from the source, and literals
+converted, on demand.
+"""
+class TokenStream:
+    # Every token type the lexer can produce, indexed by kind code
+    token_types = tuple(dict.fromkeys(
+        [INTEGER_CONST, REAL_CONST, VARIABLE]
+        + [token.type for token in Lexer.symbols.values()]
+        + [token.type for token in Lexer.reserved_words.values()]
+    ))
+    kind_codes = {token_type: code for code, token_type in enumerate(token_types)}
+
+    # Tokens without a source dependent value are shared
+    shared_tokens = {
+        token.type: token
+        for token in (*Lexer.symbols.values(), *Lexer.reserved_words.values())
+    }
+
+    def __init__(self, text, identifiers=None, origin=(1, 1)):
+        """origin is the (line, column) where text starts in its source"""
+        self.text = text
+        self.origin = origin
+        self.lexer = Lexer('', engine='regex', identifiers=identifiers)
+        self.lexer.origin = origin
+        self.source_map = None
+        self._block_ends = None
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+
+        kinds, starts, ends = self.kinds, self.starts, self.ends
+        for kind, start, end in self.scan(text, 0):
+            kinds.append(kind)
+            starts.append(start)
+            ends.append(end)
+
+    def scan(self, text, pos):
+        """(kind code, start, end) of each token in text from pos on"""
+        kind_codes, match_token, end_of_file = self.kind_codes, self.lexer.match_token, self.lexer.end_of_file
+        # Unexpected characters are reported at their position in text
+        self.lexer.text = text
+        for match in self.lexer.token_pattern.finditer(text, pos):
+            if (token := match_token(match)) is end_of_file:
+                break
+            group = match.lastgroup
+            yield kind_codes[token.type], match.start(group), match.end(group)
+
+    def edit(self, offset, removed, inserted):
+        """
+        Replace removed chars at offset with inserted and re-lex only the
+        damaged region: from the end of the last token before the edit until a
+        token lines up with an old token after the edit again. The remaining
+        old tokens are kept, their offsets shifted in one pass.
+
+        Returns the range of token indexes that were re-lexed
+        """
+        text = self.text[:offset] + inserted + self.text[offset + removed:]
+        delta = len(inserted) - removed
+        kinds, starts, ends = self.kinds, self.starts, self.ends
+
+        # Tokens ending before the edit are untouched, and lexing can restart
+        # where the last of them ends
+        first = bisect_left(ends, offset)
+        pos = ends[first - 1] if first else 0
+
+        # Old tokens starting after the removed chars are candidates to resync
+        # with. Lexing from the start of a token only depends on the text from
+        # there on, so once a new token starts where a candidate does, the
+        # rest of the old stream is still valid
+        old = bisect_left(starts, offset + removed)
+        new_kinds, new_starts, new_ends = array('B'), array('I'), array('I')
+        for kind, start, end in self.scan(text, pos):
+            while old < len(starts) and starts[old] + delta < start:
+                old += 1
+            if old < len(starts) and starts[old] + delta == start:
+                break
+            new_kinds.append(kind)
+            new_starts.append(start)
+            new_ends.append(end)
+        else:
+            old = len(starts)
+
+        kinds[first:old] = new_kinds
+        starts[first:old] = new_starts
+        ends[first:old] = new_ends
+        tail = first + len(new_kinds)
+        if delta:
+            starts[tail:] = array('I', map(delta.__add__, starts[tail:]))
+            ends[tail:] = array('I', map(delta.__add__, ends[tail:]))
+        self.text = text
+        self._block_ends = None
+        return range(first, tail)
+
+    def position(self, index):
+        """1-based (line, column) where token number index starts"""
+        if self.source_map is None or self.source_map.text is not self.text:
+            self.source_map = SourceMap(self.text, self.origin)
+        offset = self.starts[index] if index < len(self.starts) else len(self.text)
+        return self.source_map.position(offset)
+
+    def block_end(self, index):
+        """Index of the END matching the BEGIN at index, None if unmatched"""
+        if self._block_ends is None:
+            # Only the BEGIN and END kinds are visited, found by a regex over
+            # the kinds array
+            begin, end = self.kind_codes[BEGIN], self.kind_codes[END]
+            pattern = re.compile(b'[' + re.escape(bytes((begin, end))) + b']')
+            self._block_ends = block_ends = {}
+            opened = []
+            for match in pattern.finditer(self.kinds):
+                if match.group()[0] == begin:
+                    opened.append(match.start())
+                elif opened:
+                    block_ends[opened.pop()] = match.start()
+        return self._block_ends.get(index)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        token_type = self.token_types[self.kinds[index]]
+        if token_type == VARIABLE:
+            return self.lexer.identifier_token(self.text[self.starts[index]:self.ends[index]])
+        elif token_type == INTEGER_CONST:
+            return Token(INTEGER_CONST, int(self.text[self.starts[index]:self.ends[index]]))
+        elif token_type == REAL_CONST:
+            return Token(REAL_CONST, float(self.text[self.starts[index]:self.ends[index]]))
+        return self.shared_tokens[token_type]
+
+    def __iter__(self):
+        return self.tokens()
+
+    def tokens(self, index=0):
+        """Tokens from token number index on"""
+        text, token_types, shared_tokens = self.text, self.token_types, self.shared_tokens
+        identifier_token = self.lexer.identifier_token
+        kinds, starts, ends = self.kinds, self.starts, self.ends
+        # By index, so starting late in the stream costs nothing
+        for index in range(index, len(kinds)):
+            token_type, start, end = token_types[kinds[index]], starts[index], ends[index]
+            if token_type == VARIABLE:
+                yield identifier_token(text[start:end])
+            elif token_type == INTEGER_CONST:
+                yield Token(INTEGER_CONST, int(text[start:end]))
+            elif token_type == REAL_CONST:
+                yield Token(REAL_CONST, float(text[start:end]))
+            else:
+                yield shared_tokens[token_type]
@@ -1,5 +1,14 @@
 #!/usr/bin/env python
 from collections import namedtuple
+import os
+import sys
+
+if __name__ == '__main__':
+    # Run as a script, the shared lexer core, lexcore.py, is found at the top
+    # of the repository
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexcore import TableLexer
 """
 Context-free grammar
 
@@ -28,7 +37,7 @@ Tokens
 """
 Token = namedtuple('Token', ('type', 'value'))
 
-class Tokenizer:
+class Tokenizer(TableLexer):
     end_of_file = Token('EOF', None)
     keywords = {
         'BEGIN': Token('BEGIN', 'BEGIN'),
@@ -41,76 +50,21 @@ class Tokenizer:
         '*': Token('TIMES', '*'),
         '/': Token('DIVIDE', '/'),
     }
+    symbols = operations
+    # A dot straight after the integer part is swallowed, as in '5.'
+    number_regex = r'\d+(?:\.\d+|\.)?|\.\d+'
 
     def __init__(self, program):
         self.program = program
-        self.index = 0
-        self.current_char = self.program[self.index] if self.program else ''
-
-    def get_next_char(self):
-        self.index += 1
-        try:
-            self.current_char = self.program[self.index]
-        except IndexError:
-            self.current_char = ''
-        return self.current_char
-
-    def peak(self):
-        try:
-            return self.program[self.index + 1]
-        except IndexError:
-            return ''
-
-    def next_is_number(self):
-        return (
-            self.current_char.isdigit() or
-            (self.current_char == '.' and self.peak().isdigit())
-        )
-
-    def integer(self):
-        result = self.current_char
-        while self.get_next_char().isdigit():
-            result += self.current_char
-        return result
-
-    def number(self):
-        first_part = self.integer() if self.current_char.isdigit() else ''
-
-        if self.current_char == '.' and self.get_next_char().isdigit():
-            second_part = self.integer()
-        else:
-            second_part = ''
-
-        if first_part and second_part:
-            result = '{}.{}'.format(first_part, second_part)
-        elif first_part:
-            result = first_part
-        else:
-            result = '.{}'.format(second_part)
-
-        return Token('Number', result)
-
-    def operation(self):
-        result = self.operations[self.current_char]
-        self.get_next_char()
-        return result
-
-    def get_next_token(self):
-        while self.current_char and self.current_char.isspace():
-            self.get_next_char()
-
-        if self.current_char in self.operations:
-            result = self.operation()
-        elif self.next_is_number():
-            result = self.number()
-        else:
-            result = self.end_of_file
+        super().__init__(program)
 
-        return result
+    @staticmethod
+    def literal(number):
+        return Token('Number', number.rstrip('.'))
 
-    def tokenize(self):
-        while (next_token := self.get_next_token()) != self.end_of_file:
-            yield next_token
+    def unexpected(self, char, offset):
+        # Lexing stops at the first character it does not know
+        return self.end_of_file
 
 
 
@@ -122,6 +122,11 @@ class TestInterpreter(unittest.TestCase):
         interpreter = Interpreter(parser.parse_program())
         self.assertEqual({'a': 5, 'x': 11}, interpreter.interpret())
 
+    def test_million_statements(self):
+        text = 'BEGIN ' + '; '.join(['BEGIN END'] * 1_000_000) + ' END.'
+        tree = Parser(Lexer(text).tokenize()).parse_program()
+        self.assertEqual(1_000_000, len(tree.children))
+
     def test_program_with_var_manipulation(self):
         text = """
         BEGIN
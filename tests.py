@@ -4,7 +4,8 @@ import unittest
 from calc1 import Interpreter as Interpreter1
 from calc2 import Interpreter as Interpreter2
 from calc5 import Interpreter as Interpreter5
-from calc5 import Parser, Scanner, Postfixer, Lisper
+from calc5 import Parser, Scanner, Postfixer, Lisper, Peephole, RPNEvaluator
+from calc5 import PUSH, APPLY, APPLY_CONSTANT
 
 
 class TestInterpreter1(unittest.TestCase):
@@ -247,5 +248,61 @@ class TestCalc5(unittest.TestCase):
         lisper = Lisper(Parser(Scanner(text)).expr())
         self.assertEqual(lisper.evaluate(), '(/ (* (+ 5 3) 12) 3)')
 
+
+class TestRPN(unittest.TestCase):
+    expressions = (
+        '7 + 3 * (10 / (12 / (3 + 1) - 1))',
+        '(5 + 3) * 12 / 3',
+        '2 - 3 - 4',
+        '1.5 * .5 / 3',
+        '42',
+    )
+
+    def test_same_as_interpreter(self):
+        for text in self.expressions:
+            tree = Parser(Scanner(text)).expr()
+            instructions = Postfixer(tree).instructions()
+            with self.subTest(text=text):
+                expected = Interpreter5(tree).evaluate()
+                self.assertEqual(expected, RPNEvaluator(instructions).evaluate())
+                for fold in (True, False):
+                    self.assertEqual(expected, RPNEvaluator(Peephole(instructions, fold).optimize()).evaluate())
+
+    def test_instructions(self):
+        instructions = Postfixer(Parser(Scanner('2 - 3 * 4')).expr()).instructions()
+        self.assertEqual([PUSH, PUSH, PUSH, APPLY, APPLY], [opcode for opcode, _, _ in instructions])
+        self.assertEqual([2, 3, 4], [number for opcode, _, number in instructions if opcode == PUSH])
+
+    def test_constants_folded(self):
+        instructions = Postfixer(Parser(Scanner('7 + 3 * (10 / (12 / (3 + 1) - 1))')).expr()).instructions()
+        self.assertEqual([(PUSH, None, 22)], Peephole(instructions).optimize())
+
+    def test_push_fused(self):
+        instructions = Postfixer(Parser(Scanner('2 - 3 * 4')).expr()).instructions()
+        optimized = Peephole(instructions, fold=False).optimize()
+        self.assertEqual([PUSH, PUSH, APPLY_CONSTANT, APPLY], [opcode for opcode, _, _ in optimized])
+        self.assertEqual(4, optimized[2][2])
+
+    def test_division_by_zero_at_run_time(self):
+        instructions = Postfixer(Parser(Scanner('1 + 2 / (3 - 3) * 4')).expr()).instructions()
+        optimized = Peephole(instructions).optimize()
+        self.assertEqual([PUSH, PUSH, APPLY_CONSTANT, APPLY_CONSTANT, APPLY], [opcode for opcode, _, _ in optimized])
+        with self.assertRaises(ZeroDivisionError):
+            RPNEvaluator(optimized).evaluate()
+
+    def test_deep_tree(self):
+        """
+        Too deep for the recursive Interpreter
+        """
+        tree = Parser(Scanner(' - '.join(['1'] * 100_000))).expr()
+        with self.assertRaises(RecursionError):
+            Interpreter5(tree).evaluate()
+        postfixer = Postfixer(tree)
+        instructions = postfixer.instructions()
+        self.assertEqual(-99_998, RPNEvaluator(instructions).evaluate())
+        self.assertEqual(-99_998, RPNEvaluator(Peephole(instructions, fold=False).optimize()).evaluate())
+        self.assertEqual([(PUSH, None, -99_998)], Peephole(instructions).optimize())
+        self.assertTrue(postfixer.evaluate().startswith('1 1 - 1 -'))
+
 if __name__ == '__main__':
     unittest.main()